@@ -1,50 +1,15 @@
 import streamlit as st
-from tensorflow.keras.applications.densenet import preprocess_input
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
 import numpy as np
 from PIL import Image
-import tensorflow as tf
+from labels import label_map, recommendation_map
+from streamlit_support import (has_prediction, load_inference_engine, load_prediction_cache,
+                               predict_upload)
 
 st.set_page_config(page_title="MANGALYZE - Analisis Daun Mangga", layout="centered", page_icon="🍃")
 
-# Load model .h5
-@st.cache_resource
-def load_keras_model():
-    model = tf.keras.models.load_model("Model/densenet201.keras")
-    return model
-
-model = load_keras_model()
-
-label_map = {
-    0: 'Anthracnose',
-    1: 'Bacterial Canker',
-    2: 'Cutting Weevil',
-    3: 'Die Back',
-    4: 'Gall Midge',
-    5: 'Healthy',
-    6: 'Powdery Mildew',
-    7: 'Sooty Mould'
-}
-
-recommendation_map = {
-    'Anthracnose': 'Gunakan fungisida berbahan aktif (mankozeb, tembaga hidroksida, atau propineb) sesuai dosis anjuran.',
-    'Bacterial Canker': 'Potong bagian yang terinfeksi dan gunakan bakterisida berbahan tembaga (copper-based).',
-    'Cutting Weevil': 'Gunakan insektisida berbahan aktif (imidakloprid, lambda-cyhalothrin) dan periksa kebersihan lingkungan sekitar tanaman.',
-    'Die Back': 'Lakukan pemangkasan daun mati dan semprotkan fungisida sistemik (benomil, karbendazim, tebuconazole).',
-    'Gall Midge': 'Pangkas dan bakar daun/bunga yang terinfestasi dan aplikasikan insektisida sistematik (imidakloprid, abamektin, spinosad).',
-    'Healthy': 'Tanaman sehat! Lanjutkan pemupukan dan penyiraman rutin.',
-    'Powdery Mildew': 'Semprot dengan fungisida sistemik dan preventif (karathane, hexaconazole, sulfur, miklobutanil).',
-    'Sooty Mould': 'Pangkas ranting yang terlalu rimbun dan semprot air sabun ringan atau campuran air + fungisida ringan.'
-}
-
-def preprocess(image_file):
-    target_size = (224, 224)
-    # load_img menerima file-like object, cocok untuk uploaded_file Streamlit
-    img = load_img(image_file, target_size=target_size)
-    img_array = img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    img_array = preprocess_input(img_array)
-    return img_array
+# Model dan cache prediksi dimuat sekali per proses (lihat streamlit_support.py)
+load_inference_engine()
+load_prediction_cache()
 
 # ----------------- CSS Styling -----------------
 st.markdown("""
@@ -328,16 +293,15 @@ else:
     # -------- Analisis Tombol --------
 analyze_btn = st.button("🔍 Analisis Daun")
 
-if analyze_btn:
+if analyze_btn or has_prediction(uploaded_file):
         if image is None:
             st.warning("⚠️ Silakan unggah gambar terlebih dahulu.")
         else:
             with st.spinner("Menganalisis gambar..."):
                 try:
-                    input_data = preprocess(uploaded_file)
-                    output_data = model.predict(input_data)
+                    output_data, cache_hit = predict_upload(uploaded_file)
                     predicted_label = np.argmax(output_data)
-                    confidence = output_data[0][predicted_label] * 100
+                    confidence = output_data[predicted_label] * 100
                     label_name = label_map.get(predicted_label, "Unknown")
                     recommendation = recommendation_map.get(label_name, "Tidak ada rekomendasi.")
 
@@ -348,6 +312,8 @@ if analyze_btn:
                             <p>{recommendation}</p>
                         </div>
                     """, unsafe_allow_html=True)
+                    if cache_hit:
+                        st.caption("Hasil diambil dari cache.")
 
                 except Exception as e:
                     st.error(f"Terjadi kesalahan saat menganalisis: {e}")
@@ -0,0 +1,222 @@
+"""Mode serving ASGI dengan route yang sama seperti main.py.
+
+Contoh:
+    uvicorn asgi:app --port 5001 --workers 1
+
+Body upload dibaca secara async di event loop; decode, preprocessing dan
+inferensi (yang memblokir) dijalankan di thread pool berukuran
+``config.ASGI_THREADS`` sehingga koneksi lain tetap dilayani dan
+micro-batcher menerima request yang datang bersamaan.
+"""
+import asyncio
+import contextlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from starlette.templating import Jinja2Templates
+
+import config
+import metrics
+import service
+
+
+templates = Jinja2Templates(directory='templates')
+executor = ThreadPoolExecutor(max_workers=config.ASGI_THREADS,
+                              thread_name_prefix='asgi-worker')
+
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def home(request):
+    return templates.TemplateResponse(request, 'index.html', service.client_upload_settings())
+
+
+async def read_limited(request, limit):
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            break
+    return bytes(body[:limit + 1])
+
+
+def admit(request):
+    service.admit(service.client_id(request.headers, request.client and request.client.host))
+
+
+async def predict(request):
+    with metrics.IN_FLIGHT.track_inprogress():
+        deadline = service.request_deadline(request.headers.get(service.TIMEOUT_HEADER))
+        admit(request)
+        content_type = request.headers.get('content-type', '').split(';')[0].strip()
+        if content_type == service.RAW_CONTENT_TYPE:
+            with metrics.STAGE['receive'].time():
+                # Dibaca maksimal satu byte lebih dari ukuran valid
+                data = await read_limited(request, service.RAW_SIZE)
+            result = await run_blocking(service.predict_raw, data, deadline,
+                                        request.query_params.get('plot'))
+            with metrics.STAGE['respond'].time():
+                return JSONResponse(result)
+
+        with metrics.STAGE['receive'].time():
+            form = await request.form()
+            imagefile = form.get('imagefile')
+            plot = form.get('plot')
+            # Field file tanpa nama (tidak ada file dipilih) diparse sebagai string
+            has_file = isinstance(imagefile, UploadFile) and imagefile.filename
+            data = await imagefile.read() if has_file else b''
+
+        if not has_file:
+            metrics.REQUESTS.labels('predict', 'empty').inc()
+            return JSONResponse({
+                "success": False,
+                "error": "Tidak ada file yang diunggah."
+            })
+
+        result = await run_blocking(service.predict_upload, data, imagefile.filename, deadline,
+                                    plot)
+        with metrics.STAGE['respond'].time():
+            return JSONResponse(result)
+
+
+async def predict_batch(request):
+    admit(request)
+    # Antrean penuh: tolak (503) sebelum upload dibaca dan stream dimulai
+    service.check_capacity()
+    timeout_header = request.headers.get(service.TIMEOUT_HEADER)
+    # Ukuran dicek dari header sebelum body dibaca (upload chunked tanpa
+    # Content-Length ditolak); jumlah file dan field dibatasi parser multipart
+    content_length = request.headers.get('content-length')
+    if content_length is None:
+        metrics.REQUESTS.labels('batch', 'length_required').inc()
+        return JSONResponse({
+            "success": False,
+            "error": "Header Content-Length wajib untuk upload /batch."
+        }, status_code=411)
+    if not content_length.isdigit() or int(content_length) > service.BATCH_MAX_BYTES:
+        payload, status = service.batch_too_large()
+        return JSONResponse(payload, status_code=status)
+    try:
+        form = await request.form(max_files=config.BATCH_MAX_FILES,
+                                  max_fields=service.BATCH_MAX_FIELDS)
+    except HTTPException:
+        payload, status = service.batch_too_large()
+        return JSONResponse(payload, status_code=status)
+    files = form.getlist('imagefiles') or form.getlist('imagefile')
+    plot = form.get('plot')
+    uploads = [(upload.filename, upload.file) for upload in files
+               if isinstance(upload, UploadFile) and upload.filename]
+    if not uploads:
+        await form.close()
+        metrics.REQUESTS.labels('batch', 'empty').inc()
+        return JSONResponse({
+            "success": False,
+            "error": "Tidak ada file yang diunggah."
+        })
+
+    async def generate():
+        # Setiap chunk (baca arsip + decode + inferensi) berjalan di thread pool
+        chunks = service.iter_chunks(service.iter_uploads(uploads), config.STREAM_BATCH_SIZE)
+        try:
+            while True:
+                chunk = await run_blocking(next, chunks, None)
+                if chunk is None:
+                    break
+                results, proceed = await run_blocking(service.classify_batch_chunk, chunk, plot,
+                                                      timeout_header)
+                for result in results:
+                    yield json.dumps(result) + "\n"
+                if not proceed:
+                    break
+        finally:
+            await form.close()
+
+    metrics.REQUESTS.labels('batch', 'ok').inc()
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+async def rejected(request, error):
+    endpoint = 'batch' if request.url.path == '/batch' else 'predict'
+    payload, status, headers = service.rejection(error, endpoint)
+    return JSONResponse(payload, status_code=status, headers=headers)
+
+
+async def preview(request):
+    path = await run_blocking(service.preview_file, request.path_params['relative_path'],
+                              request.path_params['size'])
+    if path is None:
+        return Response(status_code=404)
+    etag = f'"{os.path.basename(path)}"'
+    headers = {'ETag': etag,
+               'Cache-Control': f'public, max-age={service.PREVIEW_MAX_AGE}, immutable'}
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+    # FileResponse menangani header Range
+    return FileResponse(path, headers=headers)
+
+
+async def prediction_history(request):
+    payload, status = await run_blocking(service.history_rows, request.query_params)
+    return JSONResponse(payload, status_code=status)
+
+
+async def prediction_history_stats(request):
+    payload, status = await run_blocking(service.history_stats, request.query_params)
+    return JSONResponse(payload, status_code=status)
+
+
+async def live(request):
+    return JSONResponse({"live": True})
+
+
+async def readiness(request):
+    if not service.ready.is_set():
+        return JSONResponse({"ready": False}, status_code=503)
+    return JSONResponse({"ready": True, "model_version": service.model_version})
+
+
+async def prometheus_metrics(request):
+    body, content_type = metrics.render()
+    return Response(body, headers={'Content-Type': content_type})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/', home, methods=['GET']),
+        Route('/', predict, methods=['POST']),
+        Route('/batch', predict_batch, methods=['POST']),
+        Route('/previews/{size:int}/{relative_path:path}', preview, methods=['GET']),
+        Route('/history', prediction_history, methods=['GET']),
+        Route('/history/stats', prediction_history_stats, methods=['GET']),
+        Route('/live', live, methods=['GET']),
+        Route('/ready', readiness, methods=['GET']),
+        Route('/metrics', prometheus_metrics, methods=['GET']),
+        Mount('/images', StaticFiles(directory='images'), name='images'),
+        Mount('/uploads', StaticFiles(directory=service.UPLOAD_FOLDER), name='uploads'),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'])],
+    exception_handlers={error: rejected for error in service.ADMISSION_ERRORS},
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=5001)
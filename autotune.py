@@ -0,0 +1,228 @@
+"""Cari thread TensorFlow, jumlah worker dan ukuran batch terbaik untuk target p99.
+
+Contoh:
+    python autotune.py --p99-ms 500 --output deployment_profile.json
+
+Untuk setiap kombinasi worker x intra-op x inter-op x max batch size,
+gunicorn dijalankan dengan gunicorn.conf.py (cache prediksi, simpan
+upload dan riwayat prediksi dimatikan) lalu fixture ``images/`` dikirim ke POST / oleh klien
+paralel dengan konkurensi yang dinaikkan bertahap sampai p99 melewati
+``--p99-ms``. Skor kombinasi adalah throughput tertinggi yang p99-nya
+masih di bawah target. Kombinasi terbaik diuji ulang dengan pinning CPU
+per worker (mode per_worker) dan pinning dipakai jika lebih cepat.
+
+``--mode`` bawaan sama dengan gunicorn.conf.py (model server bersama);
+mode yang ditala ikut ditulis ke profil sehingga gunicorn menjalankan
+mode yang sama dengan jumlah thread hasil tuning.
+
+Hasilnya ditulis sebagai profil deployment yang dibaca config.py saat
+startup (``MANGALYZE_PROFILE``), jadi main.py, asgi.py, gunicorn dan app
+Streamlit memakai setting yang sama; env tetap bisa menimpa nilainya.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from measure_workers import MODES, post_image, start_gunicorn, stop_gunicorn
+from preprocessing import list_images
+
+
+CONCURRENCY = (1, 2, 4, 8, 16, 32)
+
+
+def intra_op_share(cpu_count, workers, mode):
+    """Core per proses yang menjalankan model."""
+    # Mode model server: hanya satu proses model, worker hanya HTTP
+    return cpu_count if mode == 'model_server' else max(1, cpu_count // workers)
+
+
+def default_grid(cpu_count, mode):
+    """(workers, intra-op) yang tidak membuat core oversubscribed."""
+    grid = []
+    for workers in (1, 2, 4, 8):
+        if workers > cpu_count:
+            break
+        share = intra_op_share(cpu_count, workers, mode)
+        grid += [(workers, intra) for intra in sorted({share, max(1, share // 2)})]
+    return grid
+
+
+def wait_ready(url, timeout):
+    """Tunggu GET /ready 200 (model selesai dimuat) dan kembalikan versi model."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url + 'ready', timeout=timeout) as response:
+                return json.load(response).get('model_version')
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def run_load(url, payloads, concurrency, duration):
+    """Klien closed-loop: latensi setiap request sukses dan jumlah error."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            name, data = payloads[i % len(payloads)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                ok = post_image(url, name, data).get('success')
+            except OSError:
+                ok = False
+            with lock:
+                (latencies if ok else errors).append(time.perf_counter() - start)
+
+    clients = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = np.asarray(latencies)
+    return {
+        'concurrency': concurrency,
+        'requests': int(len(latencies)),
+        'errors': len(errors),
+        'throughput_rps': float(len(latencies) / elapsed),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99) * 1000) if len(latencies) else None,
+    }
+
+
+def passes(level, p99_ms):
+    return level['requests'] and not level['errors'] and level['p99_ms'] <= p99_ms
+
+
+def run_trial(settings, args, payloads):
+    """Jalankan gunicorn dengan ``settings`` dan naikkan konkurensi sampai p99 > target."""
+    env = dict(os.environ, **MODES[args.mode],
+               MANGALYZE_PROFILE='',
+               MANGALYZE_SAVE_UPLOADS='0',
+               MANGALYZE_CACHE_MAX_ENTRIES='0',
+               MANGALYZE_CACHE_PATH='',
+               MANGALYZE_HISTORY_PATH='',
+               MANGALYZE_INTRA_OP_THREADS=str(settings['intra_op_threads']),
+               MANGALYZE_INTER_OP_THREADS=str(settings['inter_op_threads']),
+               MANGALYZE_MAX_BATCH_SIZE=str(settings['max_batch_size']),
+               MANGALYZE_CPU_AFFINITY='1' if settings['cpu_affinity'] else '0')
+    process, _, _, startup = start_gunicorn(env, settings['workers'], args.port, args.timeout)
+    url = f'http://127.0.0.1:{args.port}/'
+    levels = []
+    try:
+        model_version = wait_ready(url, args.timeout)
+        run_load(url, payloads, 1, args.warmup)
+        for concurrency in args.concurrency:
+            level = run_load(url, payloads, concurrency, args.duration)
+            levels.append(level)
+            if not passes(level, args.p99_ms):
+                break
+    finally:
+        stop_gunicorn(process, args.timeout)
+
+    passing = [level for level in levels if passes(level, args.p99_ms)]
+    best = max(passing, key=lambda level: level['throughput_rps'], default=None)
+    trial = dict(settings=settings, startup_seconds=round(startup, 3),
+                 model_version=model_version, levels=levels, best=best)
+    summary = (f"{best['throughput_rps']:.1f} req/s @ c={best['concurrency']} "
+               f"p99={best['p99_ms']:.0f}ms" if best else 'tidak memenuhi target p99')
+    print(f"workers={settings['workers']} intra={settings['intra_op_threads']} "
+          f"inter={settings['inter_op_threads']} batch={settings['max_batch_size']} "
+          f"affinity={int(settings['cpu_affinity'])}: {summary}", flush=True)
+    return trial
+
+
+def score(trial):
+    return trial['best']['throughput_rps'] if trial['best'] else -1.0
+
+
+def main(argv=None):
+    cpu_count = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--p99-ms', type=float, required=True, help='target latensi p99')
+    parser.add_argument('--mode', choices=tuple(MODES), default='model_server')
+    parser.add_argument('--workers', type=int, nargs='*',
+                        help='bawaan: 1, 2, 4, 8 (maksimum jumlah core)')
+    parser.add_argument('--intra-op', type=int, nargs='*',
+                        help='bawaan: core per proses model dan separuhnya')
+    parser.add_argument('--inter-op', type=int, nargs='*', default=(1, 2))
+    parser.add_argument('--batch-sizes', type=int, nargs='*', default=(1, 4, 8, 16))
+    parser.add_argument('--concurrency', type=int, nargs='*', default=CONCURRENCY)
+    parser.add_argument('--duration', type=float, default=10, help='detik per level konkurensi')
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--fixtures', default='images')
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', default='deployment_profile.json')
+    args = parser.parse_args(argv)
+
+    payloads = []
+    for path in list_images(args.fixtures):
+        with open(path, 'rb') as f:
+            payloads.append((path, f.read()))
+    if not payloads:
+        parser.error(f'tidak ada gambar di {args.fixtures}')
+
+    if args.workers or args.intra_op:
+        grid = [(workers, intra)
+                for workers in (args.workers or [w for w, _ in default_grid(cpu_count, args.mode)])
+                for intra in (args.intra_op or [intra_op_share(cpu_count, workers, args.mode)])]
+        grid = sorted(set(grid))
+    else:
+        grid = default_grid(cpu_count, args.mode)
+
+    trials = []
+    for workers, intra in grid:
+        for inter in args.inter_op:
+            for batch_size in args.batch_sizes:
+                trials.append(run_trial(dict(workers=workers, intra_op_threads=intra,
+                                             inter_op_threads=inter, max_batch_size=batch_size,
+                                             cpu_affinity=False), args, payloads))
+
+    best = max(trials, key=score)
+    if best['best'] is None:
+        print(f'Tidak ada kombinasi dengan p99 <= {args.p99_ms}ms', file=sys.stderr)
+        return 1
+    if args.mode == 'per_worker' and best['settings']['workers'] > 1:
+        pinned = run_trial(dict(best['settings'], cpu_affinity=True), args, payloads)
+        trials.append(pinned)
+        if score(pinned) > score(best):
+            best = pinned
+
+    profile = {
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'p99_target_ms': args.p99_ms,
+        'mode': args.mode,
+        'cpu_count': cpu_count,
+        'model_version': best['model_version'],
+        'settings': dict(best['settings'], model_server=args.mode == 'model_server'),
+        'measured': best['best'],
+        'trials': trials,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(profile, f, indent=2)
+    settings = best['settings']
+    print(f"Terbaik: workers={settings['workers']} intra={settings['intra_op_threads']} "
+          f"inter={settings['inter_op_threads']} batch={settings['max_batch_size']} "
+          f"affinity={int(settings['cpu_affinity'])} -> "
+          f"{best['best']['throughput_rps']:.1f} req/s, p99 {best['best']['p99_ms']:.0f}ms")
+    print(f'Profil ditulis ke {args.output} (mode {args.mode})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
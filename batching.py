@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def batch_buckets(max_batch_size):
+    """Ukuran batch yang dilihat model: pangkat 2 di bawah ``max_batch_size`` + maksimumnya."""
+    buckets = []
+    size = 1
+    while size < max_batch_size:
+        buckets.append(size)
+        size *= 2
+    buckets.append(max_batch_size)
+    return tuple(buckets)
+
+
+def pad_to_bucket(batch, buckets):
+    """Tambah baris nol sampai bucket terdekat agar model tidak men-trace bentuk baru."""
+    if not buckets:
+        return batch
+    size = next((b for b in buckets if b >= len(batch)), len(batch))
+    if size == len(batch):
+        return batch
+    padding = np.zeros((size - len(batch),) + batch.shape[1:], dtype=batch.dtype)
+    return np.concatenate([batch, padding])
+
+
+class QueueFull(Exception):
+    """Antrean inferensi penuh; request sebaiknya ditolak (503)."""
+
+
+class DeadlineExceeded(Exception):
+    """Deadline request lewat sebelum inferensi dijalankan."""
+
+
+class _Request:
+    __slots__ = ('sample', 'future', 'enqueued_at', 'deadline')
+
+    def __init__(self, sample, deadline=None):
+        self.sample = sample
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+
+
+class MicroBatcher:
+    """Menggabungkan request yang datang bersamaan menjadi satu batch model.
+
+    Batch dikirim ke ``predict_fn`` saat sudah penuh (``max_batch_size``) atau
+    saat request tertua sudah menunggu ``max_wait_ms``, lalu setiap pemanggil
+    menerima baris hasilnya sendiri. Jika ``buckets`` diisi, batch di-pad
+    ke ukuran bucket terdekat (lihat ``batch_buckets``).
+
+    Antrean dibatasi ``max_queue`` sampel (0 = tanpa batas): ``submit``
+    melempar ``QueueFull`` jika penuh. Sampel dengan ``deadline``
+    (``time.monotonic()``) yang sudah lewat dibuang sebelum inferensi dan
+    Future-nya gagal dengan ``DeadlineExceeded``.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5, on_batch=None,
+                 buckets=None, max_queue=0):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size harus >= 1')
+        self.predict_fn = predict_fn
+        self.on_batch = on_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.buckets = buckets
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, sample, deadline=None):
+        """Antrekan satu sampel (tanpa dimensi batch), kembalikan Future."""
+        self._ensure_worker()
+        request = _Request(sample, deadline)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            raise QueueFull('Antrean inferensi penuh') from None
+        return request.future
+
+    def predict(self, batch, deadline=None):
+        """Pengganti ``model.predict`` untuk batch kecil dari satu request."""
+        futures = []
+        try:
+            for sample in batch:
+                futures.append(self.submit(sample, deadline))
+        except QueueFull:
+            for future in futures:
+                future.cancel()
+            raise
+        return np.stack([future.result() for future in futures])
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def full(self):
+        return self._queue.full()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Deadline lewat: ambil yang sudah mengantre saja
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [r for r in self._collect()
+                     if r.future.set_running_or_notify_cancel()]
+            now = time.monotonic()
+            for request in batch:
+                if request.deadline is not None and request.deadline <= now:
+                    request.future.set_exception(DeadlineExceeded('Deadline request lewat'))
+            batch = [r for r in batch if not r.future.done()]
+            if not batch:
+                continue
+            if self.on_batch is not None:
+                self.on_batch(len(batch))
+            inputs = np.stack([r.sample for r in batch])
+            if self.buckets:
+                inputs = pad_to_bucket(inputs, self.buckets)
+            try:
+                outputs = self.predict_fn(inputs)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, row in zip(batch, outputs):
+                request.future.set_result(row)
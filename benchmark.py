@@ -0,0 +1,255 @@
+"""Micro-benchmark per tahap jalur inferensi.
+
+Contoh:
+    python benchmark.py --output bench/hasil.json
+    python benchmark.py --output bench/baru.json --compare bench/hasil.json
+    python benchmark.py --keras-modes float32 xla bfloat16 xla_bfloat16
+
+Setiap tahap diukur terpisah: simpan upload, decode ``load_img`` (jalur
+lama dari disk) dan ``decode_image`` (jalur in-memory), ``img_to_array``,
+``preprocess_input``, inferensi model, serialisasi JSON dan overhead
+instrumentasi ``metrics.py``. Tahap gambar diukur per resolusi fixture
+``images/``, tahap batch untuk batch 1-64. ``--keras-modes`` menambahkan
+inferensi model .keras dalam mode XLA/bfloat16 (lihat
+inference.KerasEngine) beserta speedup-nya terhadap float32.
+Hasil (p50/p95/p99, images/sec) disimpan sebagai JSON agar run dapat
+dibandingkan dan regresi terdeteksi.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import config
+from inference import DEFAULT_MODEL_PATHS, KerasEngine, bfloat16_supported, load_engine
+from labels import label_map, recommendation_map
+from preprocessing import TARGET_SIZE, decode_image, list_images
+
+
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+# Mode KerasEngine yang dibandingkan dengan --keras-modes
+KERAS_MODES = {
+    'float32': {},
+    'xla': {'xla': True},
+    'bfloat16': {'precision': 'bfloat16'},
+    'xla_bfloat16': {'xla': True, 'precision': 'bfloat16'},
+}
+
+
+def measure(fn, repeats, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.asarray(samples)
+
+
+def summarize(stage, samples, images_per_call=1, **labels):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return dict(stage=stage, **labels, n=len(samples),
+                p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99),
+                mean_ms=float(samples.mean() * 1000),
+                images_per_sec=float(images_per_call / np.median(samples)))
+
+
+def fixtures_by_size(root):
+    """Satu fixture per resolusi unik di ``root``."""
+    fixtures = {}
+    for path in list_images(root):
+        with Image.open(path) as img:
+            fixtures.setdefault('%dx%d' % img.size, path)
+    return fixtures
+
+
+def bench_image_stages(fixtures, repeats):
+    from tensorflow.keras.applications.densenet import preprocess_input
+    from tensorflow.keras.preprocessing.image import img_to_array, load_img
+
+    results = []
+    tmp_dir = tempfile.mkdtemp(prefix='mangalyze-bench-')
+    for size, path in sorted(fixtures.items()):
+        with open(path, 'rb') as f:
+            data = f.read()
+        target = os.path.join(tmp_dir, os.path.basename(path))
+
+        def save_upload():
+            with open(target, 'wb') as f:
+                f.write(data)
+
+        img = load_img(path, target_size=TARGET_SIZE)
+        array = img_to_array(img)
+        stages = {
+            'save_upload': save_upload,
+            'load_img': lambda: load_img(target, target_size=TARGET_SIZE),
+            'decode_image': lambda: decode_image(data),
+            'img_to_array': lambda: img_to_array(img),
+            'preprocess_input': lambda: preprocess_input(array.copy()),
+        }
+        for stage, fn in stages.items():
+            results.append(summarize(stage, measure(fn, repeats), image_size=size,
+                                     batch_size=1, bytes=len(data)))
+    return results
+
+
+def bench_batch_stages(engine, batch_sizes, repeats):
+    from tensorflow.keras.applications.densenet import preprocess_input
+
+    results = []
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        raw = rng.integers(0, 256, (batch_size,) + TARGET_SIZE + (3,)).astype(np.float32)
+        batch = engine.prepare(raw.astype(np.uint8))
+        results.append(summarize('preprocess_input', measure(
+            lambda: preprocess_input(raw.copy()), repeats),
+            images_per_call=batch_size, image_size=None, batch_size=batch_size))
+        results.append(summarize('predict', measure(
+            lambda: engine.predict(batch), repeats),
+            images_per_call=batch_size, image_size=None, batch_size=batch_size))
+
+    probs = engine.predict(batch[:1])[0]
+    label_name = label_map[int(np.argmax(probs))]
+
+    def serialize():
+        json.dumps({
+            "success": True,
+            "prediction": f"{label_name} ({probs.max() * 100:.2f}%)",
+            "recommendation": recommendation_map[label_name],
+            "image_url": "/images/0000000000_bench.jpg",
+        })
+    results.append(summarize('json', measure(serialize, repeats * 10),
+                             image_size=None, batch_size=1))
+    return results
+
+
+def bench_keras_modes(path, modes, batch_sizes, repeats):
+    """Inferensi model .keras yang sama dalam mode float32/XLA/bfloat16."""
+    results = []
+    rng = np.random.default_rng(0)
+    for mode in modes:
+        engine = KerasEngine(path, **KERAS_MODES[mode])
+        if engine.precision != KERAS_MODES[mode].get('precision', 'float32'):
+            continue  # CPU tanpa bfloat16: sama saja dengan mode float32
+        for batch_size in batch_sizes:
+            batch = engine.prepare(
+                rng.integers(0, 256, (batch_size,) + TARGET_SIZE + (3,), dtype=np.uint8))
+            results.append(summarize('predict_keras', measure(
+                lambda: engine.predict(batch), repeats),
+                images_per_call=batch_size, image_size=None, batch_size=batch_size,
+                mode=mode))
+    return results
+
+
+def keras_mode_speedups(results):
+    """{(mode, batch_size): speedup p50 terhadap float32}."""
+    modes = [r for r in results if r['stage'] == 'predict_keras']
+    baseline = {r['batch_size']: r['p50_ms'] for r in modes if r['mode'] == 'float32'}
+    return {(r['mode'], r['batch_size']): baseline[r['batch_size']] / r['p50_ms']
+            for r in modes if r['batch_size'] in baseline}
+
+
+def bench_metrics_overhead(repeats):
+    """Biaya instrumentasi metrics.py untuk satu request POST / (tanpa kerja lain)."""
+    try:
+        import metrics
+    except ImportError:
+        return []
+
+    def instrumented_request():
+        with metrics.IN_FLIGHT.track_inprogress():
+            for stage in metrics.STAGES:
+                with metrics.STAGE[stage].time():
+                    pass
+            metrics.CACHE.labels('miss').inc()
+            metrics.observe_prediction('Healthy', 0.9)
+            metrics.REQUESTS.labels('predict', 'ok').inc()
+    return [summarize('metrics_overhead', measure(instrumented_request, repeats * 100),
+                      image_size=None, batch_size=1)]
+
+
+def compare(results, baseline, tolerance):
+    """Tahap yang p50-nya naik lebih dari ``tolerance`` (relatif) dari baseline."""
+    def key(r):
+        return r['stage'], r.get('image_size'), r.get('batch_size'), r.get('mode')
+    previous = {key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old and result['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            regressions.append((result, old))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', default='images')
+    parser.add_argument('--batch-sizes', type=int, nargs='*', default=BATCH_SIZES)
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--predict-repeats', type=int, default=10)
+    parser.add_argument('--backend', help='override MANGALYZE_BACKEND')
+    parser.add_argument('--model', help='override MANGALYZE_MODEL_PATH')
+    parser.add_argument('--keras-modes', nargs='*', choices=tuple(KERAS_MODES), default=(),
+                        help='bandingkan mode inferensi KerasEngine (mis. float32 xla bfloat16)')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='JSON hasil run sebelumnya')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='kenaikan p50 relatif yang dianggap regresi')
+    args = parser.parse_args(argv)
+
+    import tensorflow as tf
+    engine = load_engine(args.backend, args.model)
+    results = bench_image_stages(fixtures_by_size(args.fixtures), args.repeats)
+    results += bench_batch_stages(engine, args.batch_sizes, args.predict_repeats)
+    results += bench_metrics_overhead(args.repeats)
+    if args.keras_modes:
+        keras_path = engine.path if engine.backend == 'keras' else DEFAULT_MODEL_PATHS['keras']
+        results += bench_keras_modes(keras_path, args.keras_modes, args.batch_sizes,
+                                     args.predict_repeats)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'backend': engine.backend,
+            'model_version': engine.version,
+            'tflite_threads': config.TFLITE_THREADS,
+            'tensorflow': tf.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'bfloat16_supported': bfloat16_supported(),
+        },
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for r in results:
+        print(f"{r['stage']:17s} {r.get('mode') or r['image_size'] or '':>12s} b={r['batch_size']:<3d} "
+              f"p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms p99={r['p99_ms']:8.2f}ms "
+              f"{r['images_per_sec']:10.1f} img/s")
+    for (mode, batch_size), speedup in keras_mode_speedups(results).items():
+        if mode != 'float32':
+            print(f"{mode:12s} b={batch_size:<3d} {speedup:.2f}x dibanding float32")
+    print(f"Hasil ditulis ke {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for new, old in regressions:
+            print(f"REGRESI {new['stage']} {new['image_size'] or ''} b={new['batch_size']}: "
+                  f"p50 {old['p50_ms']:.2f}ms -> {new['p50_ms']:.2f}ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """Cache hasil prediksi berdasarkan hash isi upload + versi model.
+
+    Disimpan di memori sebagai LRU terbatas (``max_entries``) dengan TTL.
+    Jika ``path`` diisi, hasil juga ditulis ke SQLite lokal sehingga tetap
+    ada setelah restart. Tabel SQLite dibatasi sama seperti di memori:
+    setiap ``sweep_seconds`` (atau setiap ``max_entries`` penulisan) baris
+    kedaluwarsa dihapus dan hanya ``max_entries`` baris terbaru disimpan.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=86400, path=None, sweep_seconds=300):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.sweep_seconds = sweep_seconds
+        self._last_sweep = 0.0
+        self._writes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.path = path
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._connect()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS predictions '
+                         '(key TEXT PRIMARY KEY, probs BLOB, created REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS predictions_created '
+                         'ON predictions (created)')
+        self._sweep(time.time())
+
+    def reopen(self):
+        """Buka koneksi SQLite baru; dipanggil di proses hasil fork."""
+        self._lock = threading.Lock()
+        if self.path:
+            self._connect()
+
+    @staticmethod
+    def key(data, model_version):
+        return f'{model_version}:{content_hash(data)}'
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                probs, created = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return probs
+                del self._entries[key]
+            entry = self._load(key, now)
+            if entry is None:
+                return None
+            self._remember(key, *entry)
+            return entry[0]
+
+    def put(self, key, probs):
+        probs = np.asarray(probs, dtype=np.float32)
+        created = time.time()
+        with self._lock:
+            self._remember(key, probs, created)
+            if self._db is not None:
+                self._db.execute('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)',
+                                 (key, probs.tobytes(), created))
+                self._writes += 1
+                if (self._writes > self.max_entries
+                        or created - self._last_sweep >= self.sweep_seconds):
+                    self._sweep(created)
+                else:
+                    self._db.commit()
+
+    def get_or_compute(self, data, model_version, compute):
+        """Kembalikan ``(probs, hit)``; ``compute()`` hanya dipanggil saat miss."""
+        key = self.key(data, model_version)
+        probs = self.get(key)
+        if probs is not None:
+            return probs, True
+        probs = compute()
+        self.put(key, probs)
+        return probs, False
+
+    def _remember(self, key, probs, created):
+        self._entries[key] = (probs, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _sweep(self, now):
+        """Hapus baris kedaluwarsa dan baris di luar ``max_entries`` terbaru."""
+        self._db.execute('DELETE FROM predictions WHERE created < ?', (now - self.ttl,))
+        self._db.execute('DELETE FROM predictions WHERE key NOT IN '
+                         '(SELECT key FROM predictions ORDER BY created DESC LIMIT ?)',
+                         (self.max_entries,))
+        self._db.commit()
+        self._last_sweep = now
+        self._writes = 0
+
+    def _load(self, key, now):
+        if self._db is None:
+            return None
+        row = self._db.execute('SELECT probs, created FROM predictions WHERE key = ?',
+                               (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            self._db.execute('DELETE FROM predictions WHERE key = ?', (key,))
+            self._db.commit()
+            return None
+        return np.frombuffer(row[0], dtype=np.float32), row[1]
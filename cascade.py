@@ -0,0 +1,124 @@
+"""Pilih threshold cascade (model ringan -> model utama) dari data validasi.
+
+Contoh:
+    python cascade.py --fast model/mobilenetv2_fast.keras --val split/val \
+        --target-accuracy 0.98
+
+Kedua model dijalankan pada seluruh gambar validasi (folder per kelas),
+lalu untuk setiap kandidat threshold dihitung akurasi cascade, tingkat
+eskalasi dan biaya rata-rata per gambar. Threshold terendah (eskalasi
+paling sedikit) yang mencapai ``--target-accuracy`` ditulis ke
+``--output`` dan dibaca server saat ``MANGALYZE_CASCADE_MODEL_PATH``
+diisi (lihat inference.CascadeEngine).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import config
+from inference import load_engine, warm_up
+from preprocessing import decode_image
+
+
+def run_engine(engine, paths, batch_size):
+    """(probs, detik per gambar) untuk semua ``paths``."""
+    warm_up(engine, sorted({min(batch_size, len(paths)), len(paths) % batch_size or batch_size}))
+    outputs, seconds = [], 0.0
+    for start in range(0, len(paths), batch_size):
+        batch = engine.prepare(np.stack([decode_image(p) for p in paths[start:start + batch_size]]))
+        t0 = time.perf_counter()
+        outputs.append(engine.predict(batch))
+        seconds += time.perf_counter() - t0
+    return np.concatenate(outputs), seconds / len(paths)
+
+
+def cascade_curve(fast_probs, slow_probs, labels, fast_cost, slow_cost):
+    """Akurasi, eskalasi dan biaya cascade untuk setiap threshold yang berbeda hasilnya.
+
+    Sampel dieskalasi jika confidence model ringan < threshold.
+    """
+    confidence = fast_probs.max(axis=1)
+    order = np.argsort(confidence, kind='stable')
+    confidence = confidence[order]
+    fast_correct = (fast_probs.argmax(axis=1) == labels)[order]
+    slow_correct = (slow_probs.argmax(axis=1) == labels)[order]
+    # k sampel dengan confidence terendah dieskalasi
+    slow_hits = np.concatenate([[0], np.cumsum(slow_correct)])
+    fast_hits = np.concatenate([[0], np.cumsum(fast_correct)])
+    n = len(labels)
+
+    curve = []
+    for k in range(n + 1):
+        if 0 < k < n and confidence[k] == confidence[k - 1]:
+            continue  # threshold di tengah nilai kembar tidak bisa dicapai
+        threshold = float(confidence[k]) if k < n else 1.0 + 1e-6
+        escalation = k / n
+        curve.append({
+            'threshold': threshold,
+            'accuracy': float((slow_hits[k] + fast_hits[n] - fast_hits[k]) / n),
+            'escalation_rate': escalation,
+            'cost_ms': (fast_cost + escalation * slow_cost) * 1000,
+        })
+    return curve
+
+
+def choose_threshold(curve, target_accuracy):
+    """Titik dengan eskalasi terendah yang akurasinya >= target, atau None."""
+    candidates = [point for point in curve if point['accuracy'] >= target_accuracy]
+    return min(candidates, key=lambda point: point['escalation_rate']) if candidates else None
+
+
+def main(argv=None):
+    from feature_store import samples_from_directory
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fast', required=True, help='artefak model ringan')
+    parser.add_argument('--fast-backend', default=config.CASCADE_BACKEND)
+    parser.add_argument('--slow', help='override MANGALYZE_MODEL_PATH')
+    parser.add_argument('--slow-backend', help='override MANGALYZE_BACKEND')
+    parser.add_argument('--val', required=True, help='folder validasi per kelas')
+    parser.add_argument('--target-accuracy', type=float, default=0.98)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--output', default=config.CASCADE_REPORT)
+    args = parser.parse_args(argv)
+
+    samples = samples_from_directory(args.val)
+    paths = [path for path, _ in samples]
+    labels = np.array([label for _, label in samples])
+    fast = load_engine(args.fast_backend, args.fast, cascade=False)
+    slow = load_engine(args.slow_backend, args.slow, cascade=False)
+    fast_probs, fast_cost = run_engine(fast, paths, args.batch_size)
+    slow_probs, slow_cost = run_engine(slow, paths, args.batch_size)
+
+    curve = cascade_curve(fast_probs, slow_probs, labels, fast_cost, slow_cost)
+    chosen = choose_threshold(curve, args.target_accuracy)
+    fast_accuracy = float((fast_probs.argmax(axis=1) == labels).mean())
+    slow_accuracy = float((slow_probs.argmax(axis=1) == labels).mean())
+    print(f'{len(labels)} gambar validasi: akurasi ringan {fast_accuracy:.4f} '
+          f'({fast_cost * 1000:.1f}ms/gambar), utama {slow_accuracy:.4f} '
+          f'({slow_cost * 1000:.1f}ms/gambar)')
+    if chosen is None:
+        print(f'Tidak ada threshold yang mencapai akurasi {args.target_accuracy} '
+              f'(maksimum {max(p["accuracy"] for p in curve):.4f})', file=sys.stderr)
+        return 1
+    print(f"Threshold {chosen['threshold']:.4f}: akurasi {chosen['accuracy']:.4f}, "
+          f"eskalasi {chosen['escalation_rate']:.1%}, {chosen['cost_ms']:.1f}ms/gambar")
+
+    report = dict(chosen, target_accuracy=args.target_accuracy,
+                  fast_version=fast.version, slow_version=slow.version,
+                  fast_accuracy=fast_accuracy, slow_accuracy=slow_accuracy,
+                  fast_cost_ms=fast_cost * 1000, slow_cost_ms=slow_cost * 1000,
+                  num_samples=len(labels), curve=curve)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Laporan ditulis ke {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""Klasifikasi massal folder foto daun secara offline (tanpa web server).
+
+Contoh:
+    python classify.py /data/arsip --output hasil.csv
+    python classify.py /data/arsip --output hasil_parquet --format parquet
+
+Decode + resize berjalan di process pool, inferensi per batch memakai
+backend dari config, dan hasil ditulis bertahap. File checkpoint
+``<output>.checkpoint`` mencatat gambar yang sudah selesai sehingga run
+yang terputus dapat dilanjutkan dengan perintah yang sama.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from inference import load_engine
+from labels import label_map
+from preprocessing import decode_image, list_images
+
+
+COLUMNS = (['path', 'label', 'confidence', 'error']
+           + [f'prob_{label_map[i]}' for i in sorted(label_map)])
+
+
+def decode_worker(path):
+    start = time.perf_counter()
+    try:
+        image, error = decode_image(path), None
+    except (UnidentifiedImageError, OSError) as e:
+        image, error = None, str(e)
+    return image, error, time.perf_counter() - start
+
+
+def iter_chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def iter_decoded(pool, paths, batch_size, prefetch):
+    """Batch hasil decode; ``prefetch`` batch berikutnya sudah di-decode di pool."""
+    pending = deque()
+    for chunk in iter_chunks(paths, batch_size):
+        pending.append((chunk, pool.map(decode_worker, chunk)))
+        if len(pending) > prefetch:
+            chunk, results = pending.popleft()
+            yield chunk, list(results)
+    while pending:
+        chunk, results = pending.popleft()
+        yield chunk, list(results)
+
+
+class CsvResultWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def recover(self, state):
+        if state is None:
+            if os.path.exists(self.path) and os.path.getsize(self.path):
+                raise SystemExit(f'{self.path} sudah ada tanpa checkpoint, '
+                                 f'hapus atau pilih --output lain')
+            return
+        # Buang baris yang ditulis setelah checkpoint terakhir
+        with open(self.path, 'r+b') as f:
+            f.truncate(state['offset'])
+
+    def open(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(COLUMNS)
+
+    def commit(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'offset': self._file.tell()}
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """Satu file part Parquet per commit di dalam folder output."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit('Format parquet membutuhkan pyarrow (pip install pyarrow)')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self._parts = 0
+
+    def _part_path(self, index):
+        return os.path.join(self.path, f'part-{index:05d}.parquet')
+
+    def recover(self, state):
+        if state is None and os.path.isdir(self.path) and os.listdir(self.path):
+            raise SystemExit(f'{self.path} sudah ada tanpa checkpoint, '
+                             f'hapus atau pilih --output lain')
+        self._parts = state['parts'] if state else 0
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                if name.startswith('part-') and int(name[5:10]) >= self._parts:
+                    os.remove(os.path.join(self.path, name))
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def commit(self, rows):
+        if rows:
+            table = self._pa.Table.from_pylist([dict(zip(COLUMNS, row)) for row in rows])
+            self._pq.write_table(table, self._part_path(self._parts))
+            self._parts += 1
+        return {'parts': self._parts}
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path):
+    """(path yang sudah selesai, state writer terakhir) dari file checkpoint."""
+    done, state = set(), None
+    if not os.path.exists(path):
+        return done, state
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # baris terakhir terpotong saat proses mati
+            done.update(entry['paths'])
+            state = entry['state']
+    return done, state
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.images = 0
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def report(self, elapsed):
+        parts = [f'{self.images} gambar, {self.images / elapsed:.1f} img/s total']
+        for stage, seconds in self.seconds.items():
+            rate = self.images / seconds if seconds else float('inf')
+            parts.append(f'{stage} {rate:.1f} img/s')
+        return ' | '.join(parts)
+
+
+def commit(writer, checkpoint, rows, paths):
+    state = writer.commit(rows)
+    checkpoint.write(json.dumps({'paths': paths, 'state': state}) + '\n')
+    checkpoint.flush()
+    os.fsync(checkpoint.fileno())
+    rows.clear()
+    paths.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', help='folder foto (ditelusuri rekursif)')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--format', choices=('csv', 'parquet'), default=None,
+                        help='bawaan: dari ekstensi --output')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='jumlah batch yang di-decode mendahului inferensi')
+    parser.add_argument('--commit-every', type=int, default=1024,
+                        help='tulis hasil + checkpoint setiap N gambar')
+    parser.add_argument('--backend', help='override MANGALYZE_BACKEND')
+    parser.add_argument('--model', help='override MANGALYZE_MODEL_PATH')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.output.endswith('.csv') else 'parquet')
+    writer = CsvResultWriter(args.output) if fmt == 'csv' else ParquetResultWriter(args.output)
+    checkpoint_path = args.output.rstrip('/') + '.checkpoint'
+
+    done, state = load_checkpoint(checkpoint_path)
+    writer.recover(state)
+    all_paths = list_images(args.root)
+    paths = [p for p in all_paths if os.path.relpath(p, args.root) not in done]
+    print(f'{len(all_paths)} gambar ditemukan, {len(all_paths) - len(paths)} sudah selesai, '
+          f'{len(paths)} diproses', file=sys.stderr)
+    if not paths:
+        return 0
+
+    engine = load_engine(args.backend, args.model)
+    timer = StageTimer()
+    rows, pending_paths = [], []
+    writer.open()
+    checkpoint = open(checkpoint_path, 'a')
+    start = time.perf_counter()
+    # spawn: worker decode tidak ikut mewarisi state tensorflow dari proses induk
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(args.workers, mp_context=context) as pool:
+            for chunk, results in iter_decoded(pool, paths, args.batch_size, args.prefetch):
+                timer.add('decode (per worker)', sum(r[2] for r in results))
+                ok = [i for i, r in enumerate(results) if r[0] is not None]
+                probs = {}
+                if ok:
+                    t0 = time.perf_counter()
+                    batch = engine.prepare(np.stack([results[i][0] for i in ok]))
+                    t1 = time.perf_counter()
+                    outputs = engine.predict(batch)
+                    t2 = time.perf_counter()
+                    timer.add('preprocess', t1 - t0)
+                    timer.add('inference', t2 - t1)
+                    probs = dict(zip(ok, outputs))
+
+                for i, path in enumerate(chunk):
+                    rel_path = os.path.relpath(path, args.root)
+                    if i in probs:
+                        p = probs[i]
+                        top = int(np.argmax(p))
+                        rows.append([rel_path, label_map[top], float(p[top]), '']
+                                    + [float(v) for v in p])
+                    else:
+                        rows.append([rel_path, '', None, results[i][1]]
+                                    + [None] * len(label_map))
+                    pending_paths.append(rel_path)
+                timer.images += len(chunk)
+
+                if len(rows) >= args.commit_every:
+                    t0 = time.perf_counter()
+                    commit(writer, checkpoint, rows, pending_paths)
+                    timer.add('write', time.perf_counter() - t0)
+                    print(timer.report(time.perf_counter() - start), file=sys.stderr)
+            t0 = time.perf_counter()
+            commit(writer, checkpoint, rows, pending_paths)
+            timer.add('write', time.perf_counter() - t0)
+    finally:
+        writer.close()
+        checkpoint.close()
+    print(timer.report(time.perf_counter() - start), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
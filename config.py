@@ -0,0 +1,136 @@
+import os
+
+# Profil deployment hasil autotune.py menjadi default setting di bawah
+from deployment_profile import SETTINGS as _profile
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_optional_int(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_optional_float(name):
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+def _env_int_tuple(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return tuple(int(part) for part in value.split(','))
+
+
+# Backend inferensi: keras | savedmodel | tflite (lihat inference.py)
+BACKEND = os.environ.get('MANGALYZE_BACKEND', 'keras')
+# Kosong = path bawaan backend di DEFAULT_MODEL_PATHS
+MODEL_PATH = os.environ.get('MANGALYZE_MODEL_PATH') or None
+# Thread TensorFlow (intra-op = per operasi, inter-op = operasi paralel);
+# kosong = pilihan TensorFlow. Interpreter TFLite memakai jumlah intra-op
+INTRA_OP_THREADS = _env_optional_int('MANGALYZE_INTRA_OP_THREADS',
+                                     _profile.get('intra_op_threads'))
+INTER_OP_THREADS = _env_optional_int('MANGALYZE_INTER_OP_THREADS',
+                                     _profile.get('inter_op_threads'))
+TFLITE_THREADS = _env_optional_int('MANGALYZE_TFLITE_THREADS', INTRA_OP_THREADS)
+# Laporan parity.py; varian terkuantisasi yang tidak lolos ditolak saat load
+PARITY_REPORT = os.environ.get('MANGALYZE_PARITY_REPORT', 'model/parity_report.json')
+# Backend keras: forward pass di-compile XLA per bucket ukuran batch dan/atau
+# bfloat16 (hanya di CPU yang mendukung). Dicek otomatis terhadap float32
+# pada fixture MANGALYZE_PARITY_FIXTURES sebelum dipakai
+KERAS_XLA = _env_bool('MANGALYZE_XLA', False)
+KERAS_PRECISION = os.environ.get('MANGALYZE_PRECISION', 'float32')
+PARITY_FIXTURES = os.environ.get('MANGALYZE_PARITY_FIXTURES', 'images')
+# Cascade (lihat inference.CascadeEngine): model ringan menjawab jika
+# confidence >= threshold, sisanya diteruskan ke model utama. Threshold
+# kosong = dibaca dari laporan cascade.py
+CASCADE_MODEL_PATH = os.environ.get('MANGALYZE_CASCADE_MODEL_PATH') or None
+CASCADE_BACKEND = os.environ.get('MANGALYZE_CASCADE_BACKEND', 'keras')
+CASCADE_THRESHOLD = _env_optional_float('MANGALYZE_CASCADE_THRESHOLD')
+CASCADE_REPORT = os.environ.get('MANGALYZE_CASCADE_REPORT', 'model/cascade_report.json')
+
+
+# Micro-batching untuk route POST / (lihat batching.py)
+MAX_BATCH_SIZE = _env_int('MANGALYZE_MAX_BATCH_SIZE', _profile.get('max_batch_size', 16))
+MAX_BATCH_WAIT_MS = _env_float('MANGALYZE_MAX_BATCH_WAIT_MS', 5)
+# Ukuran batch tetap untuk endpoint POST /batch (NDJSON)
+STREAM_BATCH_SIZE = _env_int('MANGALYZE_STREAM_BATCH_SIZE', 16)
+# Batas satu request POST /batch (lebih = 413). Part multipart kecil tetap
+# di memori (werkzeug < 500 KB, Starlette < 1 MB per file), jadi jumlah
+# file membatasi memori per request; untuk banyak gambar kirim satu .zip
+# (di-spool ke disk, anggota dibaca satu per satu)
+BATCH_MAX_FILES = _env_int('MANGALYZE_BATCH_MAX_FILES', 64)
+BATCH_MAX_MB = _env_int('MANGALYZE_BATCH_MAX_MB', 512)
+# Jalankan batch dummy untuk setiap bucket ukuran batch sebelum /ready
+WARM_UP = _env_bool('MANGALYZE_WARM_UP', True)
+
+# Admission control POST / dan POST /batch: antrean micro-batcher dibatasi
+# (penuh = 503 + Retry-After; mode model server dibatasi jumlah slot),
+# 0 = tanpa batas. Harus >= MANGALYZE_STREAM_BATCH_SIZE agar chunk /batch muat
+MAX_QUEUE_DEPTH = _env_int('MANGALYZE_MAX_QUEUE_DEPTH', 64)
+QUEUE_RETRY_AFTER_SECONDS = _env_int('MANGALYZE_QUEUE_RETRY_AFTER_SECONDS', 1)
+# Deadline per request sejak diterima; header X-Request-Timeout-Ms bisa
+# memperpendeknya (POST /batch: per chunk). Request yang lewat deadline
+# dibuang sebelum inferensi (504)
+REQUEST_TIMEOUT_MS = _env_float('MANGALYZE_REQUEST_TIMEOUT_MS', 10000)
+# Rate limit per klien (token bucket, per proses worker) untuk POST / dan
+# POST /batch; 0 = mati. Klien = alamat IP, atau nilai header
+# MANGALYZE_CLIENT_ID_HEADER (misalnya X-Forwarded-For di belakang proxy)
+RATE_LIMIT_PER_SECOND = _env_float('MANGALYZE_RATE_LIMIT_PER_SECOND', 0)
+RATE_LIMIT_BURST = _env_int('MANGALYZE_RATE_LIMIT_BURST', 20)
+CLIENT_ID_HEADER = os.environ.get('MANGALYZE_CLIENT_ID_HEADER') or None
+
+# Simpan file asli upload ke uploads/ (asinkron, di luar jalur request)
+SAVE_UPLOADS = _env_bool('MANGALYZE_SAVE_UPLOADS', True)
+# Batas penyimpanan upload (lihat storage.py); 0 = tanpa batas
+UPLOAD_MAX_MB = _env_int('MANGALYZE_UPLOAD_MAX_MB', 2048)
+UPLOAD_MAX_AGE_DAYS = _env_float('MANGALYZE_UPLOAD_MAX_AGE_DAYS', 90)
+UPLOAD_EVICT_INTERVAL_SECONDS = _env_float('MANGALYZE_UPLOAD_EVICT_INTERVAL_SECONDS', 300)
+# Upload yang boleh menunggu ditulis (masing-masing memegang seluruh
+# bytes-nya); jika penuh, upload tidak disimpan tetapi tetap diprediksi
+UPLOAD_MAX_PENDING = _env_int('MANGALYZE_UPLOAD_MAX_PENDING', 32)
+# Preview yang dibuat untuk setiap upload (sisi terpanjang, px); webp | jpeg
+PREVIEW_SIZES = _env_int_tuple('MANGALYZE_PREVIEW_SIZES', (256, 768))
+PREVIEW_FORMAT = os.environ.get('MANGALYZE_PREVIEW_FORMAT', 'webp')
+# index.html memperkecil gambar di browser sebelum upload (sisi terpanjang, px)
+CLIENT_MAX_DIMENSION = _env_int('MANGALYZE_CLIENT_MAX_DIMENSION', 768)
+CLIENT_JPEG_QUALITY = _env_float('MANGALYZE_CLIENT_JPEG_QUALITY', 0.85)
+
+# Cache prediksi (lihat cache.py); path kosong = hanya di memori
+CACHE_MAX_ENTRIES = _env_int('MANGALYZE_CACHE_MAX_ENTRIES', 1024)
+CACHE_TTL_SECONDS = _env_float('MANGALYZE_CACHE_TTL_SECONDS', 86400)
+CACHE_PATH = os.environ.get('MANGALYZE_CACHE_PATH') or None
+# Riwayat prediksi (lihat history.py), ditulis per batch di background;
+# path kosong = tidak dicatat. Baris dibuang jika antrean tulis penuh
+HISTORY_PATH = os.environ.get('MANGALYZE_HISTORY_PATH', 'history/predictions.db') or None
+HISTORY_BATCH_SIZE = _env_int('MANGALYZE_HISTORY_BATCH_SIZE', 256)
+HISTORY_FLUSH_SECONDS = _env_float('MANGALYZE_HISTORY_FLUSH_SECONDS', 1)
+HISTORY_MAX_PENDING = _env_int('MANGALYZE_HISTORY_MAX_PENDING', 10000)
+# Feature hasil preprocessing yang di-memo di app Streamlit (st.cache_data)
+PREPROCESS_CACHE_ENTRIES = _env_int('MANGALYZE_PREPROCESS_CACHE_ENTRIES', 32)
+
+# Mode ASGI (asgi.py): thread pool untuk decode + inferensi di luar event loop
+ASGI_THREADS = _env_int('MANGALYZE_ASGI_THREADS', 8)
+
+# Mode multi-worker (gunicorn.conf.py): model dimuat sekali di proses
+# model server dan dipakai bersama semua worker (lihat model_server.py)
+WORKERS = _env_int('MANGALYZE_WORKERS', _profile.get('workers', 2))
+WORKER_THREADS = _env_int('MANGALYZE_WORKER_THREADS', _profile.get('worker_threads', 4))
+MODEL_SERVER = _env_bool('MANGALYZE_MODEL_SERVER', _profile.get('model_server', False))
+# Pin setiap worker gunicorn ke irisan core sendiri (hanya tanpa model server)
+CPU_AFFINITY = _env_bool('MANGALYZE_CPU_AFFINITY', _profile.get('cpu_affinity', False))
+MODEL_SERVER_SLOTS = _env_int('MANGALYZE_MODEL_SERVER_SLOTS', 64)
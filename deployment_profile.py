@@ -0,0 +1,23 @@
+"""Profil deployment hasil autotune.py.
+
+Dibaca config.py (default setting; env tetap didahulukan) dan
+gunicorn.conf.py, yang perlu mode model server sebelum config di-import.
+"""
+import json
+import os
+
+
+# Kosong = tanpa profil
+PATH = os.environ.get('MANGALYZE_PROFILE', 'deployment_profile.json')
+
+
+def load(path):
+    """Bagian ``settings`` profil, atau {} jika file tidak ada."""
+    try:
+        with open(path) as f:
+            return json.load(f).get('settings', {})
+    except FileNotFoundError:
+        return {}
+
+
+SETTINGS = load(PATH) if PATH else {}
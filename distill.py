@@ -0,0 +1,371 @@
+"""Distilasi densenet201.keras (teacher) ke model student yang lebih kecil.
+
+Contoh:
+    python distill.py --data /content/split_dataset --students mobilenetv2 compact_cnn
+
+Logit teacher untuk setiap (gambar, seed augmentasi) split train dan val
+dihitung sekali ke ``--cache`` (memmap, seperti feature_store.py) bersama
+gambar uint8-nya, jadi epoch student tidak pernah menjalankan DenseNet201.
+Cache dipakai ulang selama teacher, scaling inputnya, daftar gambar dan
+seed-nya sama. Input teacher di-scale seperti saat teacher dilatih
+(``--teacher-scaling``, bawaan ``rescale`` untuk densenet201.keras dari
+notebook); model uint8 dari export_serving.py sudah membawa scaling-nya.
+
+Student dilatih dengan soft target teacher (temperature ``--temperature``)
+ditambah label asli (bobot ``--alpha``), lalu diekspor ke ``--out-dir``
+sebagai ``<student>.keras``, ``<student>_saved_model/`` dan
+``<student>.tflite``. Semua student menerima input yang sama dengan server
+(``preprocessing.preprocess``), jadi bisa langsung dipakai lewat
+``MANGALYZE_MODEL_PATH`` atau sebagai model ringan cascade. Laporan
+akurasi split test, agreement dengan teacher, latensi batch 1 dan ukuran
+file ditulis ke ``--report``. Teacher juga diukur sebagai TFLite float32
+(``--teacher-tflite``, bawaan dikonversi ke ``--out-dir``) sehingga
+student TFLite dibandingkan dengan teacher di backend yang sama.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+from feature_store import AUGMENTATION, load_sample, samples_from_directory
+from inference import KerasEngine, TFLiteEngine, model_version
+from labels import label_map
+from parity import run_engine
+from preprocessing import SCALINGS, TARGET_SIZE, decode_image, preprocess, stratified_sample
+
+
+IMAGE_SHAPE = TARGET_SIZE + (3,)
+
+
+def _unit_range(inputs):
+    # Balik normalisasi DenseNet (preprocessing.preprocess) ke [0, 1]
+    return layers.Normalization(mean=[0.485, 0.456, 0.406],
+                                variance=[0.229 ** 2, 0.224 ** 2, 0.225 ** 2],
+                                invert=True)(inputs)
+
+
+def _classifier(inputs, features, num_classes, dropout, name):
+    x = layers.GlobalAveragePooling2D()(features)
+    x = layers.Dropout(dropout)(x)
+    # Logit dipisah dari softmax agar loss distilasi bisa memakai temperature
+    logits = layers.Dense(num_classes, name='logits')(x)
+    outputs = layers.Activation('softmax', name='probs')(logits)
+    return tf.keras.Model(inputs, outputs, name=name)
+
+
+def mobilenetv2(num_classes, weights='imagenet'):
+    inputs = tf.keras.Input(IMAGE_SHAPE)
+    x = layers.Rescaling(2.0, offset=-1.0)(_unit_range(inputs))
+    base = tf.keras.applications.MobileNetV2(weights=weights, include_top=False,
+                                             input_shape=IMAGE_SHAPE)
+    return _classifier(inputs, base(x, training=False), num_classes, 0.3, 'mobilenetv2')
+
+
+def mobilenetv3small(num_classes, weights='imagenet'):
+    inputs = tf.keras.Input(IMAGE_SHAPE)
+    x = layers.Rescaling(255.0)(_unit_range(inputs))
+    base = tf.keras.applications.MobileNetV3Small(weights=weights, include_top=False,
+                                                  input_shape=IMAGE_SHAPE)
+    return _classifier(inputs, base(x, training=False), num_classes, 0.2, 'mobilenetv3small')
+
+
+def efficientnetb0(num_classes, weights='imagenet'):
+    inputs = tf.keras.Input(IMAGE_SHAPE)
+    x = layers.Rescaling(255.0)(_unit_range(inputs))
+    base = tf.keras.applications.EfficientNetB0(weights=weights, include_top=False,
+                                                input_shape=IMAGE_SHAPE)
+    return _classifier(inputs, base(x, training=False), num_classes, 0.3, 'efficientnetb0')
+
+
+def compact_cnn(num_classes, weights=None):
+    """CNN kecil tanpa bobot pretrained (weights diabaikan)."""
+    inputs = tf.keras.Input(IMAGE_SHAPE)
+    x = _unit_range(inputs)
+    for filters in (32, 64, 128, 256):
+        x = layers.Conv2D(filters, 3, strides=2, padding='same', use_bias=False)(x)
+        x = layers.BatchNormalization()(x)
+        x = layers.ReLU()(x)
+    return _classifier(inputs, x, num_classes, 0.3, 'compact_cnn')
+
+
+STUDENTS = {
+    'mobilenetv2': mobilenetv2,
+    'mobilenetv3small': mobilenetv3small,
+    'efficientnetb0': efficientnetb0,
+    'compact_cnn': compact_cnn,
+}
+
+
+def build_teacher_cache(teacher, teacher_version, samples, out_dir,
+                        augment_seeds=(None,), batch_size=32):
+    """Tulis gambar uint8 dan logit teacher untuk setiap (gambar, seed) ke ``out_dir``.
+
+    Cache yang sudah ada dipakai ulang jika teacher, scaling dan barisnya sama.
+    """
+    rows = [(path, label, seed) for seed in augment_seeds for path, label in samples]
+    meta = {'num_rows': len(rows), 'teacher_version': teacher_version,
+            'teacher_scaling': 'uint8' if teacher.uint8_input else teacher.scaling,
+            'augment_seeds': list(augment_seeds), 'paths': [path for path, _, _ in rows]}
+    meta_path = os.path.join(out_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == meta:
+                return TeacherCache(out_dir)
+        os.remove(meta_path)
+
+    os.makedirs(out_dir, exist_ok=True)
+    images = np.lib.format.open_memmap(
+        os.path.join(out_dir, 'images.npy'), mode='w+', dtype=np.uint8,
+        shape=(len(rows),) + IMAGE_SHAPE)
+    logits = np.lib.format.open_memmap(
+        os.path.join(out_dir, 'logits.npy'), mode='w+', dtype=np.float32,
+        shape=(len(rows), len(label_map)))
+    augmenter = ImageDataGenerator(**AUGMENTATION)
+
+    for start in range(0, len(rows), batch_size):
+        batch = np.stack([load_sample(path, seed, start + offset, augmenter)
+                          for offset, (path, _, seed) in enumerate(rows[start:start + batch_size])])
+        batch = np.clip(np.rint(batch), 0, 255).astype(np.uint8)
+        images[start:start + len(batch)] = batch
+        probs = teacher.predict(teacher.prepare(batch))
+        # Teacher diakhiri softmax: log-probabilitas setara logit (beda konstanta per baris)
+        logits[start:start + len(batch)] = np.log(np.clip(probs, 1e-7, 1.0))
+    images.flush()
+    logits.flush()
+
+    np.save(os.path.join(out_dir, 'labels.npy'),
+            np.array([label for _, label, _ in rows], dtype=np.int32))
+    # meta.json ditulis terakhir: keberadaannya menandakan cache lengkap
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return TeacherCache(out_dir)
+
+
+class TeacherCache:
+    def __init__(self, path):
+        self.path = path
+        self.images = np.load(os.path.join(path, 'images.npy'), mmap_mode='r')
+        self.logits = np.load(os.path.join(path, 'logits.npy'), mmap_mode='r')
+        self.labels = np.load(os.path.join(path, 'labels.npy'))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def sequence(self, batch_size=32, shuffle=True, seed=0):
+        return DistillSequence(self, batch_size, shuffle, seed)
+
+
+class DistillSequence(tf.keras.utils.Sequence):
+    """Batch (gambar ter-preprocess, [one-hot label | logit teacher]) dari memmap."""
+
+    def __init__(self, cache, batch_size, shuffle, seed):
+        super().__init__()
+        self.cache = cache
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self._rng = np.random.default_rng(seed)
+        self._order = np.arange(len(cache))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(len(self.cache) / self.batch_size))
+
+    def __getitem__(self, index):
+        rows = np.sort(self._order[index * self.batch_size:(index + 1) * self.batch_size])
+        x = preprocess(self.cache.images[rows])
+        y = np.concatenate([
+            tf.keras.utils.to_categorical(self.cache.labels[rows], len(label_map)),
+            self.cache.logits[rows]], axis=1)
+        return x, y
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self._rng.shuffle(self._order)
+
+
+def distillation_loss(temperature, alpha):
+    """alpha * CE(label, student) + (1 - alpha) * T^2 * KL(teacher_T || student_T)."""
+    num_classes = len(label_map)
+
+    def loss(y_true, student_logits):
+        labels, teacher_logits = y_true[:, :num_classes], y_true[:, num_classes:]
+        hard = tf.keras.losses.categorical_crossentropy(labels, student_logits, from_logits=True)
+        teacher_log_probs = tf.nn.log_softmax(teacher_logits / temperature)
+        soft = tf.reduce_sum(tf.exp(teacher_log_probs) * (
+            teacher_log_probs - tf.nn.log_softmax(student_logits / temperature)), axis=-1)
+        return alpha * hard + (1 - alpha) * temperature ** 2 * soft
+    return loss
+
+
+def label_accuracy(y_true, student_logits):
+    labels = y_true[:, :len(label_map)]
+    return tf.cast(tf.equal(tf.argmax(labels, axis=1), tf.argmax(student_logits, axis=1)),
+                   tf.float32)
+
+
+def train_student(student, train_cache, val_cache=None, epochs=20, batch_size=32,
+                  learning_rate=1e-4, temperature=4.0, alpha=0.1, callbacks=None):
+    # Dilatih lewat output logit; bobotnya sama dengan model softmax yang diekspor
+    trainer = tf.keras.Model(student.input, student.get_layer('logits').output)
+    trainer.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+                    loss=distillation_loss(temperature, alpha), metrics=[label_accuracy])
+    validation = val_cache.sequence(batch_size, shuffle=False) if val_cache is not None else None
+    return trainer.fit(train_cache.sequence(batch_size), validation_data=validation,
+                       epochs=epochs, callbacks=callbacks)
+
+
+def export_student(student, out_dir):
+    """Tulis ``<nama>.keras``, ``<nama>_saved_model/`` dan ``<nama>.tflite``."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        'keras': os.path.join(out_dir, f'{student.name}.keras'),
+        'savedmodel': os.path.join(out_dir, f'{student.name}_saved_model'),
+        'tflite': os.path.join(out_dir, f'{student.name}.tflite'),
+    }
+    student.save(paths['keras'])
+    student.export(paths['savedmodel'])
+    tflite_model = tf.lite.TFLiteConverter.from_saved_model(paths['savedmodel']).convert()
+    with open(paths['tflite'], 'wb') as f:
+        f.write(tflite_model)
+    return paths
+
+
+def export_teacher_tflite(teacher, out_dir):
+    """Konversi teacher ke ``<out_dir>/<teacher>.tflite`` float32, seperti export_student."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, os.path.splitext(os.path.basename(teacher.path))[0] + '.tflite')
+    with tempfile.TemporaryDirectory() as saved_model_dir:
+        teacher.model.export(saved_model_dir)
+        tflite_model = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir).convert()
+    with open(path, 'wb') as f:
+        f.write(tflite_model)
+    return path
+
+
+def artifact_mb(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path) / 1e6
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 1e6
+
+
+def evaluate(name, paths, inputs, labels, teacher_probs, threads, scaling='densenet'):
+    """Akurasi, agreement dengan teacher, latensi batch 1 (Keras & TFLite) dan ukuran."""
+    entry = {'params': int(tf.keras.models.load_model(paths['keras']).count_params())}
+    engines = [('keras', KerasEngine(paths['keras']))]
+    if 'tflite' in paths:
+        engines.append(('tflite', TFLiteEngine(paths['tflite'], num_threads=threads)))
+    keras_probs = None
+    for backend, engine in engines:
+        engine.scaling = scaling
+        probs, latency = run_engine(engine, inputs)
+        if backend == 'keras':
+            keras_probs = probs
+        # Teacher sendiri: baris TFLite dibandingkan dengan teacher Keras
+        reference = teacher_probs if teacher_probs is not None else keras_probs
+        predicted = probs.argmax(axis=1)
+        entry[backend] = {
+            'accuracy': float(np.mean(predicted == labels)),
+            'teacher_agreement': float(np.mean(predicted == reference.argmax(axis=1))),
+            'latency_ms': float(np.median(latency) * 1000),
+            'size_mb': artifact_mb(paths[backend]),
+        }
+        print(f"{name:18s} {backend:7s} akurasi={entry[backend]['accuracy']:.4f} "
+              f"agreement={entry[backend]['teacher_agreement']:.4f} "
+              f"latensi={entry[backend]['latency_ms']:.1f}ms "
+              f"ukuran={entry[backend]['size_mb']:.1f}MB")
+    if 'savedmodel' in paths:
+        entry['savedmodel_size_mb'] = artifact_mb(paths['savedmodel'])
+    return entry, keras_probs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', required=True, help='folder split berisi train/, val/, test/')
+    parser.add_argument('--teacher', default='model/densenet201.keras')
+    parser.add_argument('--teacher-scaling', choices=SCALINGS, default='rescale',
+                        help='scaling input saat teacher dilatih (lihat export_serving.py)')
+    parser.add_argument('--teacher-tflite',
+                        help='teacher .tflite float32 (bawaan: dikonversi dari --teacher)')
+    parser.add_argument('--students', nargs='*', choices=tuple(STUDENTS),
+                        default=('mobilenetv2', 'compact_cnn'))
+    parser.add_argument('--weights', default='imagenet',
+                        help="bobot awal backbone student ('none' untuk acak)")
+    parser.add_argument('--cache', default='distill_cache')
+    parser.add_argument('--augment-seeds', type=int, nargs='*', default=(0, 1),
+                        help='varian augmentasi per gambar train (selain gambar asli)')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--learning-rate', type=float, default=1e-4)
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.1,
+                        help='bobot loss label asli (sisanya soft target teacher)')
+    parser.add_argument('--limit', type=int, default=500,
+                        help='jumlah maksimum gambar test untuk evaluasi (proporsional per kelas)')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--out-dir', default='model/students')
+    parser.add_argument('--report', default='model/distill_report.json')
+    args = parser.parse_args(argv)
+
+    teacher = KerasEngine(args.teacher)
+    teacher.scaling = args.teacher_scaling
+    teacher_version = model_version(args.teacher)
+    train_cache = build_teacher_cache(
+        teacher, teacher_version, samples_from_directory(os.path.join(args.data, 'train')),
+        os.path.join(args.cache, 'train'), augment_seeds=(None, *args.augment_seeds),
+        batch_size=args.batch_size)
+    val_cache = build_teacher_cache(
+        teacher, teacher_version, samples_from_directory(os.path.join(args.data, 'val')),
+        os.path.join(args.cache, 'val'), batch_size=args.batch_size)
+    print(f"Cache teacher: {len(train_cache)} baris train, {len(val_cache)} baris val")
+
+    test_samples = stratified_sample(samples_from_directory(os.path.join(args.data, 'test')),
+                                     args.limit, key=lambda sample: sample[1])
+    inputs = [decode_image(path) for path, _ in test_samples]
+    labels = np.array([label for _, label in test_samples])
+    teacher_paths = {'keras': args.teacher,
+                     'tflite': args.teacher_tflite or export_teacher_tflite(teacher, args.out_dir)}
+    teacher_entry, teacher_probs = evaluate('teacher', teacher_paths, inputs,
+                                            labels, None, args.threads, args.teacher_scaling)
+    report = {
+        'teacher': dict(teacher_entry, path=args.teacher, tflite_path=teacher_paths['tflite'],
+                        version=teacher_version, scaling=args.teacher_scaling),
+        'num_test_images': len(inputs),
+        'temperature': args.temperature,
+        'alpha': args.alpha,
+        'epochs': args.epochs,
+        'students': {},
+    }
+
+    weights = None if args.weights == 'none' else args.weights
+    for name in args.students:
+        student = STUDENTS[name](len(label_map), weights=weights)
+        history = train_student(
+            student, train_cache, val_cache, epochs=args.epochs, batch_size=args.batch_size,
+            learning_rate=args.learning_rate, temperature=args.temperature, alpha=args.alpha,
+            callbacks=[tf.keras.callbacks.EarlyStopping(
+                monitor='val_loss', patience=3, restore_best_weights=True)])
+        paths = export_student(student, args.out_dir)
+        entry, _ = evaluate(name, paths, inputs, labels, teacher_probs, args.threads)
+        entry['paths'] = paths
+        entry['epochs_trained'] = len(history.history['loss'])
+        entry['speedup_keras'] = report['teacher']['keras']['latency_ms'] / entry['keras']['latency_ms']
+        entry['speedup_tflite'] = (report['teacher']['tflite']['latency_ms']
+                                   / entry['tflite']['latency_ms'])
+        report['students'][name] = entry
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Laporan ditulis ke {args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
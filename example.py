@@ -1,12 +1,9 @@
-import time
-import os
 import streamlit as st
 import numpy as np
-import tensorflow as tf
 from PIL import Image
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from tensorflow.keras.applications.densenet import preprocess_input
+from labels import label_map, recommendation_map
+from streamlit_support import (has_prediction, load_inference_engine, load_prediction_cache,
+                               predict_upload)
 
 # Set page config
 st.set_page_config(
@@ -15,45 +12,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Load model
-@st.cache_resource
-def load_keras_model():
-    model = tf.keras.models.load_model("model/densenet201.keras")
-    return model
-
-model = load_keras_model()
-
-# Label and recommendation maps
-label_map = {
-    0: 'Anthracnose',
-    1: 'Bacterial Canker',
-    2: 'Cutting Weevil',
-    3: 'Die Back',
-    4: 'Gall Midge',
-    5: 'Healthy',
-    6: 'Powdery Mildew',
-    7: 'Sooty Mould'
-}
-
-recommendation_map = {
-    'Anthracnose': 'Gunakan fungisida berbahan aktif (mankozeb, tembaga hidroksida, atau propineb) sesuai dosis anjuran.',
-    'Bacterial Canker': 'Potong bagian yang terinfeksi dan gunakan bakterisida berbahan tembaga (copper-based).',
-    'Cutting Weevil': 'Gunakan insektisida berbahan aktif (imidakloprid, lambda-cyhalothrin) dan periksa kebersihan lingkungan sekitar tanaman.',
-    'Die Back': 'Lakukan pemangkasan daun mati dan semprotkan fungisida sistemik (benomil, karbendazim, tebuconazole).',
-    'Gall Midge': 'Pangkas dan bakar daun/bunga yang terinfestasi dan aplikasikan insektisida sistematik (imidakloprid, abamektin, spinosad).',
-    'Healthy': 'Tanaman sehat! Lanjutkan pemupukan dan penyiraman rutin.',
-    'Powdery Mildew': 'Semprot dengan fungisida sistemik dan preventif (karathane, hexaconazole, sulfur, miklobutanil).',
-    'Sooty Mould': 'Pangkas ranting yang terlalu rimbun dan semprot air sabun ringan atau campuran air + fungisida ringan.'
-}
-
-def preprocess(image_path):
-    target_size = (224, 224)
-    # load_img menerima file-like object, cocok untuk uploaded_file Streamlit
-    img = load_img(image_path, target_size=target_size)
-    img_array = img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    img_array = preprocess_input(img_array)
-    return img_array
+# Model dan cache prediksi dimuat sekali per proses (lihat streamlit_support.py)
+load_inference_engine()
+load_prediction_cache()
 
 # Custom CSS to style the app
 st.markdown("""
@@ -486,24 +447,16 @@ with col_right:
 
     detect_btn = st.button("Deteksi Sekarang")
 
-    if detect_btn:
+    if detect_btn or has_prediction(uploaded_file):
         if image is None:
             st.warning("⚠️ Silakan unggah gambar terlebih dahulu.")
         else:
             with st.spinner("Menganalisis gambar..."):
-                # Simpan sementara file agar bisa diproses
-                filename = f"{int(time.time())}_{uploaded_file.name}"
-                os.makedirs("temp", exist_ok=True)
-                image_path = os.path.join("temp", filename)
-                with open(image_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-
-                # Preprocess dan prediksi
-                image_processed = preprocess(image_path)
-                prediction = model.predict(image_processed)
+                # Cek hasil sesi & cache dulu; prediksi hanya saat miss
+                prediction, cache_hit = predict_upload(uploaded_file)
                 predicted_label = np.argmax(prediction)
                 label_name = label_map[predicted_label]
-                confidence = prediction[0][predicted_label] * 100
+                confidence = prediction[predicted_label] * 100
                 recommendation = recommendation_map.get(label_name, "Tidak ada rekomendasi khusus.")
 
                 # Hasil diagnosa dan rekomendasi
@@ -532,8 +485,8 @@ with col_right:
                         <p style="font-size: 1.05rem;">{recommendation}</p>
                     </div>
                 """, unsafe_allow_html=True)
-
-                os.remove(image_path)
+                if cache_hit:
+                    st.caption("Hasil diambil dari cache.")
     else:
         st.markdown("""
             <p style="text-align: center; color: #6c757d; font-style: italic; font-size: 1.05rem;">
@@ -0,0 +1,119 @@
+"""Ekspor model serving dengan preprocessing di dalam graph (input uint8).
+
+Contoh:
+    python export_serving.py --model model/densenet201.keras --scaling rescale
+
+Model hasil menerima batch uint8 mentah (N, H, W, 3) dengan ukuran
+berapa pun: resize ke 224x224 (nearest, seperti ``decode_image``) dan
+normalisasi terjadi di layer pertama, jadi pemanggil mengirim 4x lebih
+sedikit byte dan tidak menjalankan pipeline float NumPy. Semua entry
+point (main.py, asgi.py, app.py, example.py, model server) mengenali
+input uint8 dan melewati ``preprocessing.preprocess`` (lihat
+``InferenceEngine.prepare``), sehingga skala input selalu sama dengan
+yang tertanam di model.
+
+``--scaling`` harus sama dengan preprocessing saat training:
+
+* ``rescale``: x / 255, seperti ``ImageDataGenerator(rescale=1./255)``
+  di notebook (densenet201.keras dari bagian training).
+* ``densenet``: ``preprocess_input`` DenseNet (x / 255, lalu mean/std
+  ImageNet), untuk model yang dilatih lewat ``preprocessing.preprocess``
+  (feature_store.py, distill.py, prune.py, model ringan cascade).
+
+Output: ``<model>_uint8.keras``, SavedModel ``<model>_uint8_saved_model/``
+dan opsional ``<model>_uint8.tflite``. Sebelum ditulis, model serving
+dibandingkan dengan model asli (input float hasil scaling yang sama) pada
+fixture ``images/``.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+
+from preprocessing import SCALINGS, TARGET_SIZE, decode_image, list_images
+
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+def scale_images(images, scaling):
+    """Scaling yang sama dengan graph serving, di NumPy (untuk uji paritas)."""
+    x = np.asarray(images, dtype=np.float32) / 255.0
+    if scaling == 'densenet':
+        x = (x - IMAGENET_MEAN) / IMAGENET_STD
+    return x.astype(np.float32)
+
+
+def build_serving_model(model, scaling, target_size=TARGET_SIZE):
+    if scaling not in SCALINGS:
+        raise ValueError(f"Scaling tidak dikenal: {scaling!r} (pilih salah satu dari {SCALINGS})")
+    inputs = tf.keras.Input((None, None, 3), dtype='uint8', name='image')
+    x = layers.Resizing(*target_size, interpolation='nearest', name='resize')(inputs)
+    x = layers.Rescaling(1.0 / 255, name='rescale')(x)
+    if scaling == 'densenet':
+        x = layers.Normalization(mean=IMAGENET_MEAN, variance=[s ** 2 for s in IMAGENET_STD],
+                                 name='imagenet_normalization')(x)
+    outputs = model(x)
+    return tf.keras.Model(inputs, outputs, name=f'{model.name}_uint8')
+
+
+def check_parity(model, serving_model, scaling, fixtures, limit=32):
+    """Selisih maksimum probabilitas dan top-1 agreement pada fixture."""
+    from parity import compare
+    images = np.stack([decode_image(path) for path in list_images(fixtures)[:limit]])
+    expected = np.asarray(model.predict_on_batch(scale_images(images, scaling)))
+    actual = np.asarray(serving_model.predict_on_batch(images))
+    return dict(compare(expected, actual), max_abs_diff=float(np.abs(expected - actual).max()),
+                num_images=len(images))
+
+
+def export(serving_model, output, saved_model_dir=None, tflite=False):
+    paths = {'keras': output}
+    serving_model.save(output)
+    if saved_model_dir or tflite:
+        paths['savedmodel'] = saved_model_dir or os.path.splitext(output)[0] + '_saved_model'
+        serving_model.export(paths['savedmodel'])
+    if tflite:
+        paths['tflite'] = os.path.splitext(output)[0] + '.tflite'
+        with open(paths['tflite'], 'wb') as f:
+            f.write(tf.lite.TFLiteConverter.from_saved_model(paths['savedmodel']).convert())
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='model/densenet201.keras')
+    parser.add_argument('--scaling', required=True, choices=SCALINGS,
+                        help='preprocessing saat model dilatih')
+    parser.add_argument('--output', help='bawaan: <model>_uint8.keras')
+    parser.add_argument('--saved-model-dir', help='bawaan: <output>_saved_model')
+    parser.add_argument('--no-saved-model', action='store_true')
+    parser.add_argument('--tflite', action='store_true', help='ekspor juga <output>.tflite')
+    parser.add_argument('--fixtures', default='images')
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.model)[0] + '_uint8.keras'
+    model = tf.keras.models.load_model(args.model)
+    serving_model = build_serving_model(model, args.scaling)
+    result = check_parity(model, serving_model, args.scaling, args.fixtures)
+    print(f"{result['num_images']} fixture: agreement={result['top1_agreement']:.4f} "
+          f"selisih maksimum={result['max_abs_diff']:.2e}")
+    if result['top1_agreement'] < args.min_agreement:
+        print('Model serving berbeda dari model asli, tidak diekspor', file=sys.stderr)
+        return 1
+
+    saved_model_dir = None if args.no_saved_model else (
+        args.saved_model_dir or os.path.splitext(output)[0] + '_saved_model')
+    paths = export(serving_model, output, saved_model_dir, args.tflite)
+    for kind, path in paths.items():
+        print(f'{kind}: {path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Feature map backbone DenseNet201 yang di-cache untuk melatih ulang head.
+
+Backbone di notebook dibekukan (``base_model.trainable = False``), jadi
+output-nya untuk satu gambar (dan satu seed augmentasi) selalu sama.
+Feature map dihitung sekali ke file memmap, lalu head (Conv2D/Dense di
+atasnya) dilatih langsung dari file tersebut tanpa menjalankan 201 layer
+backbone di setiap epoch.
+
+Contoh (lihat juga bagian "Retraining Cepat" di notebook):
+    model = load_model('model/densenet201.keras')
+    backbone, head = split_model(model)
+    build_feature_store(backbone, samples_from_directory('split/train'),
+                        'features/train', augment_seeds=(None, 0, 1))
+    build_feature_store(backbone, samples_from_directory('split/val'), 'features/val')
+    train_head(head, FeatureStore('features/train'), FeatureStore('features/val'))
+    merge_head(model, head).save('model/densenet201_retrained.keras')
+"""
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+from labels import label_map
+from preprocessing import decode_image, list_images, preprocess
+
+
+# Augmentasi yang sama dengan train_datagen di notebook (tanpa rescale,
+# normalisasi dilakukan oleh preprocess seperti di server)
+AUGMENTATION = dict(
+    rotation_range=20,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    zoom_range=0.2,
+    horizontal_flip=True,
+    brightness_range=[0.8, 1.2],
+    fill_mode='nearest',
+)
+
+
+def samples_from_directory(root):
+    """(path, indeks kelas) dari folder per kelas, urutan kelas seperti flow_from_directory."""
+    classes = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    samples = []
+    for index, class_name in enumerate(classes):
+        samples += [(path, index) for path in list_images(os.path.join(root, class_name))]
+    return samples
+
+
+def load_sample(path, seed, row, augmenter):
+    """Gambar float32 (H, W, 3): asli jika ``seed`` None, selain itu varian
+    augmentasi deterministik untuk (seed, baris)."""
+    image = decode_image(path).astype(np.float32)
+    if seed is not None:
+        image = augmenter.random_transform(image, seed=seed * 1000003 + row)
+    return image
+
+
+def split_model(model):
+    """Pisahkan model Sequential notebook menjadi (backbone, head baru berbobot sama)."""
+    backbone = model.layers[0]
+    head = tf.keras.Sequential(
+        [tf.keras.Input(shape=backbone.output.shape[1:])]
+        + [layer.__class__.from_config(layer.get_config()) for layer in model.layers[1:]])
+    for source, target in zip(model.layers[1:], head.layers):
+        target.set_weights(source.get_weights())
+    return backbone, head
+
+
+def merge_head(model, head):
+    """Salin bobot head hasil training kembali ke model penuh."""
+    for source, target in zip(head.layers, model.layers[1:]):
+        target.set_weights(source.get_weights())
+    return model
+
+
+def build_feature_store(backbone, samples, out_dir, augment_seeds=(None,),
+                        batch_size=32, dtype='float16'):
+    """Tulis feature map untuk setiap (gambar, seed) ke ``out_dir``.
+
+    Seed ``None`` berarti gambar asli tanpa augmentasi; seed lain memberi
+    satu varian augmentasi deterministik per gambar.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    feature_shape = tuple(backbone.output.shape[1:])
+    rows = [(path, label, seed) for seed in augment_seeds for path, label in samples]
+    features = np.lib.format.open_memmap(
+        os.path.join(out_dir, 'features.npy'), mode='w+', dtype=dtype,
+        shape=(len(rows),) + feature_shape)
+    augmenter = ImageDataGenerator(**AUGMENTATION)
+
+    for start in range(0, len(rows), batch_size):
+        images = [load_sample(path, seed, start + offset, augmenter)
+                  for offset, (path, _, seed) in enumerate(rows[start:start + batch_size])]
+        batch = preprocess(np.stack(images))
+        features[start:start + len(images)] = backbone(batch, training=False).numpy()
+    features.flush()
+
+    np.save(os.path.join(out_dir, 'labels.npy'),
+            np.array([label for _, label, _ in rows], dtype=np.int32))
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'num_rows': len(rows), 'feature_shape': feature_shape,
+                   'dtype': dtype, 'augment_seeds': list(augment_seeds),
+                   'paths': [path for path, _, _ in rows]}, f)
+    return FeatureStore(out_dir)
+
+
+class FeatureStore:
+    def __init__(self, path):
+        self.path = path
+        self.features = np.load(os.path.join(path, 'features.npy'), mmap_mode='r')
+        self.labels = np.load(os.path.join(path, 'labels.npy'))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def sequence(self, batch_size=64, num_classes=len(label_map), shuffle=True, seed=0):
+        return FeatureSequence(self, batch_size, num_classes, shuffle, seed)
+
+
+class FeatureSequence(tf.keras.utils.Sequence):
+    """Batch (feature, one-hot label) langsung dari memmap."""
+
+    def __init__(self, store, batch_size, num_classes, shuffle, seed):
+        super().__init__()
+        self.store = store
+        self.batch_size = batch_size
+        self.num_classes = num_classes
+        self.shuffle = shuffle
+        self._rng = np.random.default_rng(seed)
+        self._order = np.arange(len(store))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(len(self.store) / self.batch_size))
+
+    def __getitem__(self, index):
+        # Indeks diurutkan agar pembacaan memmap sekuensial
+        rows = np.sort(self._order[index * self.batch_size:(index + 1) * self.batch_size])
+        x = np.asarray(self.store.features[rows], dtype=np.float32)
+        y = tf.keras.utils.to_categorical(self.store.labels[rows], self.num_classes)
+        return x, y
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self._rng.shuffle(self._order)
+
+
+def train_head(head, train_store, val_store=None, epochs=30, batch_size=64,
+               learning_rate=1e-4, callbacks=None):
+    num_classes = len(label_map)
+    head.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+                 loss='categorical_crossentropy', metrics=['accuracy'])
+    validation = None
+    if val_store is not None:
+        validation = val_store.sequence(batch_size, num_classes, shuffle=False)
+    return head.fit(train_store.sequence(batch_size, num_classes),
+                    validation_data=validation, epochs=epochs, callbacks=callbacks)
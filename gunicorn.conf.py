@@ -0,0 +1,64 @@
+"""Konfigurasi gunicorn untuk mode multi-worker.
+
+Contoh:
+    gunicorn -c gunicorn.conf.py
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+Master mem-fork satu proses model server (model_server.py) sebelum
+worker, sehingga TensorFlow dan model hanya dimuat sekali. Dengan
+MANGALYZE_MODEL_SERVER=0 setiap worker kembali memuat model sendiri
+(dipakai measure_workers.py sebagai pembanding); dengan
+MANGALYZE_CPU_AFFINITY=1 setiap worker itu di-pin ke irisan core sendiri.
+"""
+import gc
+import os
+import sys
+
+from deployment_profile import SETTINGS as PROFILE
+
+# Bawaan gunicorn: model server bersama, kecuali profil autotune.py
+# ditala untuk mode per_worker (env tetap didahulukan)
+os.environ.setdefault('MANGALYZE_MODEL_SERVER', '1' if PROFILE.get('model_server', True) else '0')
+
+# Bukan ``import config``: nama itu dibaca gunicorn sebagai setting
+from config import CPU_AFFINITY, MODEL_SERVER, WORKERS, WORKER_THREADS
+
+
+wsgi_app = 'main:app'
+bind = os.environ.get('MANGALYZE_BIND', '0.0.0.0:5001')
+workers = WORKERS
+threads = WORKER_THREADS
+# Model server harus di-fork dari master, jadi aplikasi dimuat sebelum worker
+preload_app = MODEL_SERVER
+
+
+def when_ready(server):
+    service = sys.modules.get('service')
+    if service is not None and service.model_server is not None:
+        server.log.info('Model server pid %s siap (%s)',
+                        service.model_server.pid, service.model_version)
+    # Objek hasil preload tidak berubah lagi; bekukan dari GC agar
+    # halaman memorinya tetap dibagi copy-on-write dengan worker
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    # Slot CPU dipilih di master agar worker pengganti mewarisi slot yang kosong
+    used = {getattr(other, 'cpu_slot', None) for other in server.WORKERS.values()}
+    worker.cpu_slot = min(set(range(server.num_workers)) - used, default=0)
+
+
+def post_fork(server, worker):
+    if CPU_AFFINITY and not MODEL_SERVER:
+        cpus = sorted(os.sched_getaffinity(0))
+        share = max(1, len(cpus) // server.num_workers)
+        start = worker.cpu_slot * share % len(cpus)
+        os.sched_setaffinity(0, cpus[start:start + share])
+        server.log.info('Worker %s di-pin ke CPU %s', worker.pid, cpus[start:start + share])
+    service = sys.modules.get('service')
+    if service is not None:
+        service.after_fork()
+
+
+def post_worker_init(worker):
+    worker.log.info('Worker %s siap', worker.pid)
@@ -0,0 +1,180 @@
+"""Riwayat prediksi di SQLite lokal, ditulis write-behind dari thread background."""
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+
+import numpy as np
+
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS predictions ('
+    ' id INTEGER PRIMARY KEY, created REAL NOT NULL, content_hash TEXT NOT NULL,'
+    ' label TEXT NOT NULL, confidence REAL NOT NULL, probs BLOB NOT NULL,'
+    " model_version TEXT, latency_ms REAL, cache_hit INTEGER, plot TEXT NOT NULL DEFAULT '')",
+    'CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)',
+    'CREATE INDEX IF NOT EXISTS predictions_label_created ON predictions (label, created)',
+    # Rollup per jam: stats() cukup membaca baris jam x plot x label
+    'CREATE TABLE IF NOT EXISTS hourly_counts ('
+    ' hour INTEGER NOT NULL, plot TEXT NOT NULL, label TEXT NOT NULL, count INTEGER NOT NULL,'
+    ' PRIMARY KEY (hour, plot, label)) WITHOUT ROWID',
+)
+# Label bucket stats() dari kolom hour (epoch / 3600), dalam waktu lokal
+BUCKETS = {
+    'hour': "strftime('%Y-%m-%dT%H:00', hour * 3600, 'unixepoch', 'localtime')",
+    'day': "date(hour * 3600, 'unixepoch', 'localtime')",
+}
+COLUMNS = ('id', 'created', 'content_hash', 'label', 'confidence', 'probs',
+           'model_version', 'latency_ms', 'cache_hit', 'plot')
+
+
+class PredictionHistory:
+    """Riwayat setiap prediksi (hash isi, label, probabilitas, versi model, latensi).
+
+    ``record`` hanya memasukkan baris ke antrean sehingga jalur request
+    tidak pernah menunggu disk; thread writer menulis sampai
+    ``batch_size`` baris per transaksi, paling lambat ``flush_seconds``
+    setelah baris pertama masuk. Jika antrean sudah berisi ``max_pending``
+    baris, baris baru dibuang (``on_drop`` dipanggil). Jumlah per jam x
+    plot x label di-rollup di transaksi yang sama, jadi ``stats`` tidak
+    memindai tabel prediksi.
+    """
+
+    def __init__(self, path, batch_size=256, flush_seconds=1.0, max_pending=10000,
+                 on_drop=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.on_drop = on_drop
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            db.commit()
+
+    def _connect(self):
+        # Beberapa worker gunicorn menulis ke file yang sama; tunggu lock
+        return sqlite3.connect(self.path, timeout=30)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def record(self, content_hash, label, probs, model_version, latency_ms,
+               cache_hit=False, plot=None, created=None):
+        probs = np.asarray(probs, dtype=np.float32)
+        row = (time.time() if created is None else created, content_hash, label,
+               float(probs.max()), probs.tobytes(), model_version, latency_ms,
+               int(cache_hit), plot or '')
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if self.on_drop is not None:
+                self.on_drop()
+
+    def close(self, timeout=10):
+        """Tulis sisa antrean lalu hentikan writer."""
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join(timeout)
+            self._writer = None
+
+    def _ensure_writer(self):
+        # Thread tidak ikut ter-fork: setiap proses memulai writer sendiri
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                self._writer = threading.Thread(
+                    target=self._run, name='history-writer', daemon=True)
+                self._writer.start()
+                self._writer_pid = os.getpid()
+
+    def _collect(self):
+        rows = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while rows[-1] is not None and len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                rows.append(self._queue.get(timeout=remaining) if remaining > 0
+                            else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        db = self._connect()
+        db.execute('PRAGMA synchronous=NORMAL')
+        while True:
+            rows = self._collect()
+            stop = rows[-1] is None
+            rows = [row for row in rows if row is not None]
+            if rows:
+                self._write(db, rows)
+            if stop:
+                db.close()
+                return
+
+    @staticmethod
+    def _write(db, rows):
+        counts = Counter((int(row[0] // 3600), row[8], row[2]) for row in rows)
+        with db:
+            db.executemany('INSERT INTO predictions (created, content_hash, label, confidence, '
+                           'probs, model_version, latency_ms, cache_hit, plot) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            db.executemany('INSERT INTO hourly_counts VALUES (?, ?, ?, ?) '
+                           'ON CONFLICT (hour, plot, label) '
+                           'DO UPDATE SET count = count + excluded.count',
+                           [key + (count,) for key, count in counts.items()])
+
+    def stats(self, since, until, bucket='day', plot=None):
+        """Jumlah prediksi per bucket waktu x plot x label dalam [since, until).
+
+        Dibaca dari rollup per jam, jadi batas waktu dibulatkan ke jam penuh.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f'Bucket tidak dikenal: {bucket!r} (pilih salah satu dari {tuple(BUCKETS)})')
+        query = (f'SELECT {BUCKETS[bucket]} AS bucket, plot, label, SUM(count) '
+                 'FROM hourly_counts WHERE hour >= ? AND hour < ?')
+        params = [math.floor(since / 3600), math.ceil(until / 3600)]
+        if plot is not None:
+            query += ' AND plot = ?'
+            params.append(plot)
+        query += ' GROUP BY bucket, plot, label ORDER BY bucket, plot, label'
+        with closing(self._connect()) as db:
+            rows = db.execute(query, params).fetchall()
+        return [{'bucket': b, 'plot': p or None, 'label': label, 'count': count}
+                for b, p, label, count in rows]
+
+    def query(self, since, until, label=None, plot=None, limit=100):
+        """Prediksi terbaru dalam [since, until) (indeks waktu / label + waktu)."""
+        query = f'SELECT {", ".join(COLUMNS)} FROM predictions WHERE created >= ? AND created < ?'
+        params = [since, until]
+        if label is not None:
+            query += ' AND label = ?'
+            params.append(label)
+        if plot is not None:
+            query += ' AND plot = ?'
+            params.append(plot)
+        query += ' ORDER BY created DESC LIMIT ?'
+        params.append(limit)
+        with closing(self._connect()) as db:
+            rows = db.execute(query, params).fetchall()
+        results = []
+        for row in rows:
+            result = dict(zip(COLUMNS, row))
+            result['probs'] = np.frombuffer(result['probs'], dtype=np.float32).tolist()
+            result['cache_hit'] = bool(result['cache_hit'])
+            result['plot'] = result['plot'] or None
+            results.append(result)
+        return results
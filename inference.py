@@ -0,0 +1,431 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import config
+from batching import batch_buckets, pad_to_bucket
+from preprocessing import preprocess
+
+
+DEFAULT_MODEL_PATHS = {
+    'keras': 'model/densenet201.keras',
+    'savedmodel': 'model/saved_model',
+    'tflite': 'model/densenet201.tflite',
+}
+
+# Varian hasil kuantisasi: model/densenet201_<varian>.tflite (lihat quantize.py)
+QUANTIZED_VARIANTS = ('dynamic', 'float16', 'int8')
+
+
+class ParityGateError(RuntimeError):
+    """Artefak terkuantisasi belum lolos (atau gagal) uji paritas akurasi."""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(path):
+    """Sidik jari artefak model (file atau folder SavedModel)."""
+    if not os.path.isdir(path):
+        return file_sha256(path)[:16]
+    digest = hashlib.sha256()
+    for name in ('saved_model.pb', os.path.join('variables', 'variables.index')):
+        full_path = os.path.join(path, name)
+        if os.path.exists(full_path):
+            digest.update(file_sha256(full_path).encode())
+    return digest.hexdigest()[:16]
+
+
+def quantized_variant(path):
+    """Nama varian kuantisasi dari path artefak, atau None."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for variant in QUANTIZED_VARIANTS:
+        if stem.endswith('_' + variant):
+            return variant
+    return None
+
+
+def check_parity_gate(path, report_path=None):
+    """Tolak artefak yang tidak tercatat lolos di laporan parity.py."""
+    report_path = report_path or config.PARITY_REPORT
+    try:
+        with open(report_path) as f:
+            report = json.load(f)
+    except FileNotFoundError:
+        raise ParityGateError(
+            f"{path}: laporan paritas {report_path} tidak ditemukan, "
+            f"jalankan parity.py terlebih dahulu") from None
+    entry = report.get('variants', {}).get(os.path.basename(path))
+    if entry is None:
+        raise ParityGateError(f"{path}: tidak ada di laporan paritas {report_path}")
+    if entry.get('sha256') != file_sha256(path):
+        raise ParityGateError(
+            f"{path}: artefak berubah sejak uji paritas, jalankan ulang parity.py")
+    if not entry.get('passed'):
+        raise ParityGateError(
+            f"{path}: gagal uji paritas (agreement={entry.get('top1_agreement')}, "
+            f"drift={entry.get('mean_confidence_drift')})")
+
+
+class InferenceEngine:
+    """Antarmuka bersama semua backend: ``predict(batch)`` -> (n, kelas)."""
+
+    backend = None
+    # True untuk model hasil export_serving.py: input uint8 mentah,
+    # resize dan normalisasi terjadi di dalam graph
+    uint8_input = False
+    # Scaling input float (preprocessing.SCALINGS), harus sama dengan saat
+    # training model; diabaikan untuk model uint8
+    scaling = 'densenet'
+
+    def __init__(self, path):
+        self.path = path
+        # Bagian dari kunci cache prediksi (cache.py)
+        self.version = f'{self.backend}:{model_version(path)}'
+
+    def prepare(self, images):
+        """uint8 (H, W, 3) atau (N, H, W, 3) -> input ``predict`` model ini."""
+        if not self.uint8_input:
+            return preprocess(images, self.scaling)
+        batch = np.asarray(images, dtype=np.uint8)
+        return batch[np.newaxis] if batch.ndim == 3 else batch
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+
+PRECISIONS = ('float32', 'bfloat16')
+
+
+def bfloat16_supported():
+    """CPU punya instruksi bfloat16 native (AVX512-BF16 atau AMX)."""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = next((line.split(':', 1)[1].split() for line in f
+                          if line.startswith('flags')), [])
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def _with_dtype_policy(model, policy):
+    """Salinan ``model`` dengan dtype policy ``policy``; layer output tetap float32."""
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('class_name') == 'DTypePolicy':
+                node['config']['name'] = policy
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    model_config = model.get_config()
+    walk(model_config)
+    model_config['layers'][-1]['config']['dtype'] = 'float32'
+    clone = model.__class__.from_config(model_config)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+def serving_buckets():
+    """Bucket ukuran batch POST / dan chunk POST /batch (yang di-warm-up)."""
+    return batch_buckets(max(config.MAX_BATCH_SIZE, config.STREAM_BATCH_SIZE))
+
+
+def check_accelerated_parity(reference, engine, fixtures=None):
+    """Bandingkan ``engine`` dengan model float32 ``reference`` pada fixture.
+
+    Ambang sama dengan uji paritas kuantisasi (parity.py); gagal ->
+    ParityGateError.
+    """
+    from parity import compare
+    from preprocessing import decode_image, list_images
+    buckets = serving_buckets()
+    paths = list_images(fixtures or config.PARITY_FIXTURES)[:buckets[-1]]
+    if not paths:
+        raise ParityGateError(f"{engine.version}: tidak ada fixture untuk uji paritas "
+                              f"di {fixtures or config.PARITY_FIXTURES}")
+    # Di-pad ke bucket serving (mis. 14 fixture -> 16) agar XLA tidak
+    # meng-compile bentuk batch yang tidak pernah dipakai; baris padding
+    # tidak ikut dibandingkan
+    batch = pad_to_bucket(engine.prepare(np.stack([decode_image(path) for path in paths])),
+                          buckets)
+    expected = np.asarray(reference.predict_on_batch(batch))[:len(paths)]
+    actual = engine.predict(batch)[:len(paths)]
+    result = compare(expected, actual)
+    if result['top1_agreement'] < 0.99 or result['mean_confidence_drift'] > 0.05:
+        raise ParityGateError(
+            f"{engine.version}: berbeda dari float32 pada {len(paths)} fixture "
+            f"(agreement={result['top1_agreement']:.4f}, "
+            f"drift={result['mean_confidence_drift']:.4f})")
+    return result
+
+
+class KerasEngine(InferenceEngine):
+    """Model .keras; opsional forward pass XLA dan/atau bfloat16.
+
+    Dengan ``xla``, forward pass di-compile sekali per bentuk input, yaitu
+    per bucket ukuran batch (lihat batching.batch_buckets) saat warm-up.
+    ``precision='bfloat16'`` hanya dipakai jika CPU mendukungnya. Mode
+    selain float32 biasa dicek dulu terhadap float32 pada fixture
+    (check_accelerated_parity) dan menambah sufiks pada ``version``.
+    """
+
+    backend = 'keras'
+
+    def __init__(self, path, xla=False, precision='float32', check_parity=True):
+        super().__init__(path)
+        from tensorflow.keras.models import load_model
+        if precision not in PRECISIONS:
+            raise ValueError(f"Presisi tidak dikenal: {precision!r} "
+                             f"(pilih salah satu dari {PRECISIONS})")
+        if precision == 'bfloat16' and not bfloat16_supported():
+            print(f"{path}: CPU tidak mendukung bfloat16, memakai float32", file=sys.stderr)
+            precision = 'float32'
+        self.model = load_model(path)
+        self.uint8_input = self.model.inputs[0].dtype == 'uint8'
+        self.xla = xla
+        self.precision = precision
+        self._forward = None
+        if not xla and precision == 'float32':
+            return
+
+        import tensorflow as tf
+        reference = self.model
+        if precision == 'bfloat16':
+            self.model = _with_dtype_policy(reference, 'mixed_bfloat16')
+            self.version += '+bf16'
+        if xla:
+            self.version += '+xla'
+        model = self.model
+        self._forward = tf.function(lambda batch: model(batch, training=False), jit_compile=xla)
+        if check_parity:
+            check_accelerated_parity(reference, self)
+
+    def predict(self, batch):
+        if self._forward is not None:
+            batch = np.asarray(batch, dtype=np.uint8 if self.uint8_input else np.float32)
+            return np.asarray(self._forward(batch), dtype=np.float32)
+        # predict_on_batch melewati setup data adapter & callback milik
+        # predict(), yang mendominasi waktu untuk batch kecil
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class SavedModelEngine(InferenceEngine):
+    backend = 'savedmodel'
+
+    def __init__(self, path, signature='serving_default'):
+        super().__init__(path)
+        import tensorflow as tf
+        self._tf = tf
+        self.module = tf.saved_model.load(path)
+        self.fn = self.module.signatures[signature]
+        self.input_name, self.input_spec = next(
+            iter(self.fn.structured_input_signature[1].items()))
+        self.output_name = next(iter(self.fn.structured_outputs))
+        self.uint8_input = self.input_spec.dtype == tf.uint8
+
+    def predict(self, batch):
+        inputs = self._tf.convert_to_tensor(batch, dtype=self.input_spec.dtype)
+        outputs = self.fn(**{self.input_name: inputs})
+        return outputs[self.output_name].numpy()
+
+
+def _tflite_interpreter_class():
+    # tflite_runtime jauh lebih ringan dari tensorflow penuh jika terpasang
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteEngine(InferenceEngine):
+    backend = 'tflite'
+
+    def __init__(self, path, num_threads=None):
+        super().__init__(path)
+        Interpreter = _tflite_interpreter_class()
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._refresh_details()
+        # Interpreter tidak thread-safe
+        self._lock = threading.Lock()
+
+    def _refresh_details(self):
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        # uint8 tanpa parameter kuantisasi = preprocessing di graph
+        self.uint8_input = (self._input['dtype'] == np.uint8
+                            and not self._input['quantization'][0])
+
+    def _quantize(self, batch):
+        dtype = self._input['dtype']
+        scale, zero_point = self._input['quantization']
+        if not np.issubdtype(dtype, np.integer) or not scale:
+            return np.asarray(batch, dtype=dtype)
+        info = np.iinfo(dtype)
+        q = np.round(np.asarray(batch, dtype=np.float32) / scale + zero_point)
+        return np.clip(q, info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output):
+        scale, zero_point = self._output['quantization']
+        if not np.issubdtype(output.dtype, np.integer) or not scale:
+            return output
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        # Model full-int8 memakai input/output integer
+        batch = self._quantize(batch)
+        with self._lock:
+            if tuple(self._input['shape']) != batch.shape:
+                self.interpreter.resize_tensor_input(
+                    self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._refresh_details()
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index']).copy()
+        return self._dequantize(output)
+
+
+class CascadeEngine:
+    """Model ringan dulu; hanya sampel dengan confidence < ``threshold`` ke model utama.
+
+    Jika ``buckets`` diisi, kedua tahap di-pad sendiri ke bucket ukuran
+    batch (lihat batching.batch_buckets), jadi pemanggil tidak perlu
+    mem-pad: baris padding tidak boleh ikut dieskalasi ke model utama.
+    Input selalu uint8 (``prepare``); setiap tahap menyiapkan input
+    modelnya sendiri. ``on_result(n, n_eskalasi, detik_ringan,
+    detik_utama)`` dipanggil setiap batch.
+    """
+
+    backend = 'cascade'
+    uint8_input = True
+
+    def __init__(self, fast, slow, threshold, buckets=None, on_result=None):
+        self.fast = fast
+        self.slow = slow
+        self.threshold = threshold
+        self.buckets = buckets
+        self.on_result = on_result
+        self.path = slow.path
+        self.version = f'cascade:{fast.version}+{slow.version}@{threshold:g}'
+
+    @property
+    def stages(self):
+        return self.fast, self.slow
+
+    prepare = InferenceEngine.prepare
+
+    def _predict(self, engine, batch):
+        if self.buckets:
+            return engine.predict(engine.prepare(pad_to_bucket(batch, self.buckets)))[:len(batch)]
+        return engine.predict(engine.prepare(batch))
+
+    def predict(self, batch):
+        start = time.perf_counter()
+        probs = np.array(self._predict(self.fast, batch), dtype=np.float32)
+        fast_seconds = time.perf_counter() - start
+
+        escalate = np.flatnonzero(probs.max(axis=1) < self.threshold)
+        slow_seconds = 0.0
+        if len(escalate):
+            start = time.perf_counter()
+            probs[escalate] = self._predict(self.slow, batch[escalate])
+            slow_seconds = time.perf_counter() - start
+        if self.on_result is not None:
+            self.on_result(len(batch), len(escalate), fast_seconds, slow_seconds)
+        return probs
+
+
+def cascade_threshold(report_path=None):
+    """Threshold dari ``MANGALYZE_CASCADE_THRESHOLD`` atau laporan cascade.py."""
+    if config.CASCADE_THRESHOLD is not None:
+        return config.CASCADE_THRESHOLD
+    report_path = report_path or config.CASCADE_REPORT
+    try:
+        with open(report_path) as f:
+            return json.load(f)['threshold']
+    except FileNotFoundError:
+        raise ValueError(
+            f"Threshold cascade belum ditentukan: set MANGALYZE_CASCADE_THRESHOLD "
+            f"atau jalankan cascade.py (laporan {report_path} tidak ditemukan)") from None
+
+
+def configure_threads():
+    """Terapkan MANGALYZE_INTRA_OP_THREADS / MANGALYZE_INTER_OP_THREADS ke TensorFlow.
+
+    Harus dipanggil sebelum TensorFlow menjalankan operasi pertama; jika
+    sudah terlambat, setting diabaikan dengan peringatan.
+    """
+    if config.INTRA_OP_THREADS is None and config.INTER_OP_THREADS is None:
+        return
+    import tensorflow as tf
+    threading_config = tf.config.threading
+    wanted = {'intra': config.INTRA_OP_THREADS, 'inter': config.INTER_OP_THREADS}
+    current = {'intra': threading_config.get_intra_op_parallelism_threads(),
+               'inter': threading_config.get_inter_op_parallelism_threads()}
+    try:
+        if wanted['intra'] is not None and current['intra'] != wanted['intra']:
+            threading_config.set_intra_op_parallelism_threads(wanted['intra'])
+        if wanted['inter'] is not None and current['inter'] != wanted['inter']:
+            threading_config.set_inter_op_parallelism_threads(wanted['inter'])
+    except RuntimeError:
+        print(f"Thread TensorFlow sudah diinisialisasi, setting intra/inter-op "
+              f"{wanted['intra']}/{wanted['inter']} diabaikan", file=sys.stderr)
+
+
+def load_engine(backend=None, path=None, cascade=True):
+    """Muat backend inferensi sesuai konfigurasi (``MANGALYZE_BACKEND``).
+
+    Jika ``MANGALYZE_CASCADE_MODEL_PATH`` diisi (dan ``cascade`` True),
+    engine dibungkus ``CascadeEngine`` dengan model ringan tersebut.
+    """
+    if cascade and config.CASCADE_MODEL_PATH:
+        fast = load_engine(config.CASCADE_BACKEND, config.CASCADE_MODEL_PATH, cascade=False)
+        slow = load_engine(backend, path, cascade=False)
+        return CascadeEngine(fast, slow, cascade_threshold())
+
+    backend = backend or config.BACKEND
+    if backend not in DEFAULT_MODEL_PATHS:
+        raise ValueError(f"Backend tidak dikenal: {backend!r} "
+                         f"(pilih salah satu dari {sorted(DEFAULT_MODEL_PATHS)})")
+    path = path or config.MODEL_PATH or DEFAULT_MODEL_PATHS[backend]
+    if backend != 'tflite':
+        configure_threads()
+    if quantized_variant(path) is not None:
+        check_parity_gate(path)
+    if backend == 'keras':
+        return KerasEngine(path, xla=config.KERAS_XLA, precision=config.KERAS_PRECISION)
+    if backend == 'savedmodel':
+        return SavedModelEngine(path)
+    return TFLiteEngine(path, num_threads=config.TFLITE_THREADS)
+
+
+def warm_up(engine, batch_sizes):
+    """Jalankan batch dummy untuk setiap ukuran batch; kembalikan durasinya (detik).
+
+    Tracing graph dan pemilihan kernel terjadi di sini, bukan di request
+    pertama.
+    """
+    from preprocessing import TARGET_SIZE
+    start = time.perf_counter()
+    # Cascade: kedua model di-warm-up, termasuk model utama yang hanya
+    # dipanggil saat ada eskalasi
+    for stage in getattr(engine, 'stages', (engine,)):
+        for batch_size in batch_sizes:
+            stage.predict(stage.prepare(np.zeros((batch_size,) + TARGET_SIZE + (3,), dtype=np.uint8)))
+    return time.perf_counter() - start
@@ -0,0 +1,21 @@
+label_map = {
+    0: 'Anthracnose',
+    1: 'Bacterial Canker',
+    2: 'Cutting Weevil',
+    3: 'Die Back',
+    4: 'Gall Midge',
+    5: 'Healthy',
+    6: 'Powdery Mildew',
+    7: 'Sooty Mould'
+}
+
+recommendation_map = {
+    'Anthracnose': 'Gunakan fungisida berbahan aktif (mankozeb, tembaga hidroksida, atau propineb) sesuai dosis anjuran.',
+    'Bacterial Canker': 'Potong bagian yang terinfeksi dan gunakan bakterisida berbahan tembaga (copper-based).',
+    'Cutting Weevil': 'Gunakan insektisida berbahan aktif (imidakloprid, lambda-cyhalothrin) dan periksa kebersihan lingkungan sekitar tanaman.',
+    'Die Back': 'Lakukan pemangkasan daun mati dan semprotkan fungisida sistemik (benomil, karbendazim, tebuconazole).',
+    'Gall Midge': 'Pangkas dan bakar daun/bunga yang terinfestasi dan aplikasikan insektisida sistematik (imidakloprid, abamektin, spinosad).',
+    'Healthy': 'Tanaman sehat! Lanjutkan pemupukan dan penyiraman rutin.',
+    'Powdery Mildew': 'Semprot dengan fungisida sistemik dan preventif (karathane, hexaconazole, sulfur, miklobutanil).',
+    'Sooty Mould': 'Pangkas ranting yang terlalu rimbun dan semprot air sabun ringan atau campuran air + fungisida ringan.'
+}
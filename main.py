@@ -1,88 +1,149 @@
-from flask import Flask, render_template, request, send_from_directory, jsonify
-import os
-from PIL import Image
+from flask import (Flask, render_template, request, jsonify, Response, abort, send_file,
+                   send_from_directory)
 from flask_cors import CORS
-import time
-from werkzeug.utils import secure_filename
-import numpy as np
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from tensorflow.keras.applications.densenet import preprocess_input
-from tensorflow.keras.models import load_model
+from werkzeug.exceptions import RequestEntityTooLarge
+import io
+import json
+import os
+
+import config
+import metrics
+import service
 
 
 app = Flask(__name__, static_folder='images', static_url_path='/images')
 CORS(app)
-model = load_model('model/densenet201.keras')
-
-UPLOAD_FOLDER = 'images'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-label_map = {
-    0: 'Anthracnose',
-    1: 'Bacterial Canker',
-    2: 'Cutting Weevil',
-    3: 'Die Back',
-    4: 'Gall Midge',
-    5: 'Healthy',
-    6: 'Powdery Mildew',
-    7: 'Sooty Mould'
-}
-
-recommendation_map = {
-    'Anthracnose': 'Gunakan fungisida berbahan aktif (mankozeb, tembaga hidroksida, atau propineb) sesuai dosis anjuran.',
-    'Bacterial Canker': 'Potong bagian yang terinfeksi dan gunakan bakterisida berbahan tembaga (copper-based).',
-    'Cutting Weevil': 'Gunakan insektisida berbahan aktif (imidakloprid, lambda-cyhalothrin) dan periksa kebersihan lingkungan sekitar tanaman.',
-    'Die Back': 'Lakukan pemangkasan daun mati dan semprotkan fungisida sistemik (benomil, karbendazim, tebuconazole).',
-    'Gall Midge': 'Pangkas dan bakar daun/bunga yang terinfestasi dan aplikasikan insektisida sistematik (imidakloprid, abamektin, spinosad).',
-    'Healthy': 'Tanaman sehat! Lanjutkan pemupukan dan penyiraman rutin.',
-    'Powdery Mildew': 'Semprot dengan fungisida sistemik dan preventif (karathane, hexaconazole, sulfur, miklobutanil).',
-    'Sooty Mould': 'Pangkas ranting yang terlalu rimbun dan semprot air sabun ringan atau campuran air + fungisida ringan.'
-}
-
-def extract_features(image_path):
-    img = load_img(image_path, target_size=(224, 224))  # ukuran untuk CNN
-    img_array = img_to_array(img)  # (224, 224, 3)
-    img_array = preprocess_input(img_array)
-    return np.expand_dims(img_array, axis=0)  # (1, 224, 224, 3)
 
 @app.route('/', methods=['GET'])
 def home():
-    return render_template('index.html')
+    return render_template('index.html', **service.client_upload_settings())
 
 @app.route('/', methods=['POST'])
+@metrics.IN_FLIGHT.track_inprogress()
 def predict():
-    print("MASUK KE ROUTE POST")
-    imagefile = request.files['imagefile']
-    print("Image file diterima:", imagefile.filename)
+    deadline = service.request_deadline(request.headers.get(service.TIMEOUT_HEADER))
+    service.admit(service.client_id(request.headers, request.remote_addr))
+    if request.mimetype == service.RAW_CONTENT_TYPE:
+        with metrics.STAGE['receive'].time():
+            # Dibaca maksimal satu byte lebih dari ukuran valid
+            data = request.stream.read(service.RAW_SIZE + 1)
+        result = service.predict_raw(data, deadline, request.args.get('plot'))
+        with metrics.STAGE['respond'].time():
+            return jsonify(result)
+
+    with metrics.STAGE['receive'].time():
+        imagefile = request.files['imagefile']
+        data = imagefile.read()
 
     if imagefile.filename == '':
+        metrics.REQUESTS.labels('predict', 'empty').inc()
+        return jsonify({
+            "success": False,
+            "error": "Tidak ada file yang diunggah."
+        })
+
+    result = service.predict_upload(data, imagefile.filename, deadline, request.form.get('plot'))
+    with metrics.STAGE['respond'].time():
+        return jsonify(result)
+
+@app.route('/batch', methods=['POST'])
+def predict_batch():
+    service.admit(service.client_id(request.headers, request.remote_addr))
+    # Antrean penuh: tolak (503) sebelum upload dibaca dan stream dimulai
+    service.check_capacity()
+    timeout_header = request.headers.get(service.TIMEOUT_HEADER)
+    # Lewat batas: werkzeug berhenti mem-parse dan melempar 413
+    request.max_content_length = service.BATCH_MAX_BYTES
+    request.max_form_parts = config.BATCH_MAX_FILES + service.BATCH_MAX_FIELDS
+    files = request.files.getlist('imagefiles') or request.files.getlist('imagefile')
+    plot = request.form.get('plot')
+    if len(files) > config.BATCH_MAX_FILES:
+        payload, status = service.batch_too_large()
+        return jsonify(payload), status
+    if not any(upload.filename for upload in files):
+        metrics.REQUESTS.labels('batch', 'empty').inc()
         return jsonify({
             "success": False,
             "error": "Tidak ada file yang diunggah."
         })
 
-    filename = f"{int(time.time())}_{secure_filename(imagefile.filename)}"
-    image_path = os.path.join(UPLOAD_FOLDER, filename)
-    imagefile.save(image_path)
+    # Flask menutup request.files begitu view selesai, sebelum response
+    # di-stream; ambil alih stream upload (tetap di spool disk werkzeug).
+    uploads = []
+    for upload in files:
+        uploads.append((upload.filename, upload.stream))
+        upload.stream = io.BytesIO()
+
+    def generate():
+        # Hanya satu chunk yang di-decode di memori pada satu waktu;
+        # hasil dikirim begitu setiap batch selesai.
+        try:
+            chunks = service.iter_chunks(service.iter_uploads(uploads), config.STREAM_BATCH_SIZE)
+            for chunk in chunks:
+                results, proceed = service.classify_batch_chunk(chunk, plot, timeout_header)
+                for result in results:
+                    yield json.dumps(result) + "\n"
+                if not proceed:
+                    break
+        finally:
+            for _, stream in uploads:
+                stream.close()
+
+    metrics.REQUESTS.labels('batch', 'ok').inc()
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def rejected(error):
+    endpoint = 'batch' if request.endpoint == 'predict_batch' else 'predict'
+    payload, status, headers = service.rejection(error, endpoint)
+    return jsonify(payload), status, headers
+
+for error in service.ADMISSION_ERRORS:
+    app.register_error_handler(error, rejected)
+
+@app.errorhandler(RequestEntityTooLarge)
+def too_large(error):
+    payload, status = service.batch_too_large()
+    return jsonify(payload), status
+
+@app.route('/previews/<int:size>/<path:relative_path>', methods=['GET'])
+def preview(size, relative_path):
+    path = service.preview_file(relative_path, size)
+    if path is None:
+        abort(404)
+    # conditional: If-None-Match -> 304 dan dukungan Range
+    response = send_file(os.path.abspath(path), conditional=True, etag=os.path.basename(path),
+                         max_age=service.PREVIEW_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/uploads/<path:relative_path>', methods=['GET'])
+def uploaded_file(relative_path):
+    return send_from_directory(os.path.abspath(service.UPLOAD_FOLDER), relative_path)
+
+@app.route('/history', methods=['GET'])
+def prediction_history():
+    payload, status = service.history_rows(request.args)
+    return jsonify(payload), status
 
-    image = extract_features(image_path)
-    print("Image shape:", image.shape)
+@app.route('/history/stats', methods=['GET'])
+def prediction_history_stats():
+    payload, status = service.history_stats(request.args)
+    return jsonify(payload), status
 
-    prediction = model.predict(image)
-    print("Raw prediction:", prediction)
+@app.route('/live', methods=['GET'])
+def live():
+    return jsonify({"live": True})
 
-    predicted_label = np.argmax(prediction)
-    label_name = label_map[predicted_label]
-    confidence = prediction[0][predicted_label] * 100
-    final_result = f"{label_name} ({confidence:.2f}%)"
-    recommendation = recommendation_map.get(label_name, "Tidak ada rekomendasi khusus.")
+@app.route('/ready', methods=['GET'])
+def readiness():
+    if not service.ready.is_set():
+        return jsonify({"ready": False}), 503
+    return jsonify({"ready": True, "model_version": service.model_version})
 
-    return jsonify({
-        "success": True,
-        "prediction": final_result,
-        "recommendation": recommendation,
-        "image_url": f"/images/{filename}"
-    })
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
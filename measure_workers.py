@@ -0,0 +1,159 @@
+"""Bandingkan startup dan memori multi-worker: model server bersama vs model per worker.
+
+Contoh:
+    python measure_workers.py --workers 4 --output bench/workers.json
+
+Untuk setiap mode, gunicorn dijalankan dengan gunicorn.conf.py, waktu
+sampai semua worker siap dicatat, beberapa gambar fixture dikirim ke
+POST / agar model benar-benar dipakai, lalu RSS, PSS dan USS (memori
+privat) setiap proses dibaca dari /proc/<pid>/smaps_rollup. PSS membagi
+halaman bersama secara adil antar proses, jadi total PSS adalah memori
+yang benar-benar dipakai server.
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+
+from preprocessing import list_images
+
+
+MODES = {
+    'model_server': {'MANGALYZE_MODEL_SERVER': '1'},
+    'per_worker': {'MANGALYZE_MODEL_SERVER': '0'},
+}
+READY = re.compile(r'Worker (\d+) siap')
+MODEL_SERVER = re.compile(r'Model server pid (\d+)')
+
+
+def memory_kb(pid):
+    """Rss, Pss dan USS (Private_Clean + Private_Dirty) dalam kB."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {'rss': values['Rss'], 'pss': values['Pss'],
+            'uss': values['Private_Clean'] + values['Private_Dirty']}
+
+
+def post_image(url, path, data=None):
+    boundary = uuid.uuid4().hex
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="imagefile"; '
+            f'filename="{os.path.basename(path)}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + \
+        f'\r\n--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(
+        url, data=body, headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.load(response)
+
+
+def start_gunicorn(env, workers, port, timeout, args=()):
+    """Jalankan gunicorn dengan gunicorn.conf.py dan tunggu semua worker siap.
+
+    Kembalikan (process, {pid worker: detik sampai siap}, [pid model server],
+    detik startup). Pemanggil menghentikan ``process`` dengan SIGTERM.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         '--workers', str(workers), '--bind', f'127.0.0.1:{port}', *args],
+        env=env, stderr=subprocess.PIPE, text=True)
+
+    ready, server_pid = {}, []
+    all_ready = threading.Event()
+
+    def read_log():
+        for line in process.stderr:
+            match = READY.search(line)
+            if match:
+                ready[int(match.group(1))] = time.perf_counter() - start
+                if len(ready) == workers:
+                    all_ready.set()
+            match = MODEL_SERVER.search(line)
+            if match:
+                server_pid.append(int(match.group(1)))
+    threading.Thread(target=read_log, daemon=True).start()
+
+    if not all_ready.wait(timeout):
+        stop_gunicorn(process, timeout)
+        raise SystemExit(f'Worker tidak siap dalam {timeout} detik')
+    return process, ready, server_pid, time.perf_counter() - start
+
+
+def stop_gunicorn(process, timeout):
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout)
+
+
+def run_mode(mode, workers, port, fixtures, requests, timeout):
+    env = dict(os.environ, **MODES[mode], MANGALYZE_SAVE_UPLOADS='0', MANGALYZE_HISTORY_PATH='')
+    process, ready, server_pid, startup = start_gunicorn(env, workers, port, timeout)
+    try:
+        url = f'http://127.0.0.1:{port}/'
+        for i in range(requests):
+            post_image(url, fixtures[i % len(fixtures)])
+
+        processes = [dict(role='master', pid=process.pid, **memory_kb(process.pid))]
+        processes += [dict(role='model_server', pid=pid, **memory_kb(pid)) for pid in server_pid]
+        processes += [dict(role='worker', pid=pid, ready_seconds=round(seconds, 3),
+                           **memory_kb(pid)) for pid, seconds in sorted(ready.items())]
+    finally:
+        stop_gunicorn(process, timeout)
+
+    return {
+        'mode': mode,
+        'workers': workers,
+        'startup_seconds': round(startup, 3),
+        'processes': processes,
+        'total_pss_kb': sum(p['pss'] for p in processes),
+        'total_rss_kb': sum(p['rss'] for p in processes),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='*', choices=tuple(MODES), default=tuple(MODES))
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--fixtures', default='images')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='request POST / sebelum memori diukur')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', help='tulis hasil sebagai JSON')
+    args = parser.parse_args(argv)
+
+    fixtures = list_images(args.fixtures)
+    results = [run_mode(mode, args.workers, args.port, fixtures, args.requests, args.timeout)
+               for mode in args.modes]
+
+    for result in results:
+        print(f"{result['mode']}: {result['workers']} worker siap dalam "
+              f"{result['startup_seconds']:.1f}s, total PSS "
+              f"{result['total_pss_kb'] / 1024:.0f} MB, total RSS "
+              f"{result['total_rss_kb'] / 1024:.0f} MB")
+        for p in result['processes']:
+            print(f"  {p['role']:12s} pid={p['pid']:<7d} rss={p['rss'] / 1024:7.1f}MB "
+                  f"pss={p['pss'] / 1024:7.1f}MB uss={p['uss'] / 1024:7.1f}MB")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+STAGES = ('receive', 'decode', 'preprocess', 'inference', 'respond')
+
+REQUESTS = Counter('mangalyze_requests_total', 'Request prediksi per endpoint dan hasil',
+                   ['endpoint', 'status'])
+IN_FLIGHT = Gauge('mangalyze_requests_in_flight', 'Request prediksi yang sedang diproses')
+STAGE_SECONDS = Histogram(
+    'mangalyze_stage_seconds', 'Latensi per tahap jalur prediksi', ['stage'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+PREDICTIONS = Counter('mangalyze_predictions_total', 'Jumlah prediksi per kelas', ['label'])
+CONFIDENCE = Histogram('mangalyze_prediction_confidence', 'Confidence kelas teratas (0-1)',
+                       buckets=(.2, .3, .4, .5, .6, .7, .8, .9, .95, .99, 1.0))
+CACHE = Counter('mangalyze_cache_total', 'Lookup cache prediksi', ['result'])
+QUEUE_DEPTH = Gauge('mangalyze_batch_queue_depth', 'Request yang menunggu di micro-batcher')
+BATCH_SIZE = Histogram('mangalyze_batch_size', 'Ukuran batch yang dikirim ke model',
+                       buckets=(1, 2, 4, 8, 16, 32, 64))
+SHED = Counter('mangalyze_requests_shed_total',
+               'Request yang ditolak admission control (queue_full, rate_limited)', ['reason'])
+DEADLINE_EXCEEDED = Counter('mangalyze_deadline_exceeded_total',
+                            'Request yang dibuang karena deadline lewat sebelum inferensi')
+HISTORY_PENDING = Gauge('mangalyze_history_pending', 'Prediksi yang belum ditulis ke riwayat')
+HISTORY_DROPPED = Counter('mangalyze_history_dropped_total',
+                          'Prediksi yang tidak dicatat karena antrean riwayat penuh')
+WARMUP_SECONDS = Gauge('mangalyze_warmup_seconds', 'Durasi warm-up model saat startup')
+FIRST_REQUEST_SECONDS = Gauge('mangalyze_first_request_seconds',
+                              'Latensi request prediksi pertama setelah start')
+UPLOAD_STORE_BYTES = Gauge('mangalyze_upload_store_bytes', 'Total ukuran upload tersimpan')
+UPLOADS_EVICTED = Counter('mangalyze_uploads_evicted_total', 'Upload yang dihapus eviction')
+UPLOADS_SKIPPED = Counter('mangalyze_uploads_skipped_total',
+                          'Upload yang tidak disimpan karena antrean tulis penuh')
+CASCADE_IMAGES = Counter('mangalyze_cascade_images_total',
+                         'Gambar yang diproses cascade (accepted = dijawab model ringan)',
+                         ['result'])
+CASCADE_MODEL_SECONDS = Counter('mangalyze_cascade_model_seconds_total',
+                                'Waktu model per tahap cascade (biaya rata-rata = total / gambar)',
+                                ['model'])
+
+# Child label di-resolve sekali agar instrumentasi per request tetap murah
+STAGE = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+
+def observe_prediction(label_name, confidence):
+    PREDICTIONS.labels(label_name).inc()
+    CONFIDENCE.observe(confidence)
+
+
+def observe_eviction(evicted, total_bytes):
+    UPLOADS_EVICTED.inc(evicted)
+    UPLOAD_STORE_BYTES.set(total_bytes)
+
+
+def observe_cascade(images, escalated, fast_seconds, slow_seconds):
+    CASCADE_IMAGES.labels('accepted').inc(images - escalated)
+    CASCADE_IMAGES.labels('escalated').inc(escalated)
+    CASCADE_MODEL_SECONDS.labels('fast').inc(fast_seconds)
+    CASCADE_MODEL_SECONDS.labels('slow').inc(slow_seconds)
+
+
+def render():
+    """(body, content type) untuk endpoint /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,226 @@
+"""Satu proses model untuk semua worker HTTP (mode multi-worker).
+
+TensorFlow tidak aman di-fork setelah model dimuat (thread pool-nya ikut
+tersalin dalam keadaan terkunci), jadi model tidak dibagi lewat
+copy-on-write. Proses induk (master gunicorn, lihat gunicorn.conf.py)
+mem-fork satu proses server *sebelum* TensorFlow di-import; proses itu
+memuat model sekali, dan worker yang di-fork setelahnya mengirim gambar
+hasil decode lewat slot shared memory lalu membaca probabilitas kelas
+dari slot yang sama. Request dari semua worker digabung oleh
+MicroBatcher di proses server.
+
+Slot sekaligus menjadi batas antrean semua worker: ``predict`` dengan
+``block=False`` melempar ``batching.QueueFull`` jika semua slot terpakai.
+Deadline request (``time.monotonic()``, jam yang sama di semua proses)
+ikut ditulis ke slot, dan server membuang gambar yang deadline-nya lewat
+sebelum inferensi.
+"""
+import collections
+import functools
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from batching import DeadlineExceeded, MicroBatcher, QueueFull
+from labels import label_map
+from preprocessing import TARGET_SIZE
+
+
+IMAGE_SHAPE = TARGET_SIZE + (3,)
+# Status slot di ``_failed``
+OK, FAILED, EXPIRED = 0, 1, 2
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelServer:
+    """Klien dan proses server untuk model bersama.
+
+    Dibuat dan di-``start()`` di proses induk sebelum worker di-fork;
+    ``predict`` dipanggil dari worker dengan batch uint8 (N, 224, 224, 3)
+    dan mengembalikan probabilitas (N, jumlah kelas). Preprocessing
+    dilakukan di proses server sehingga worker tidak perlu TensorFlow.
+    """
+
+    def __init__(self, backend=None, path=None, num_slots=64, max_batch_size=16,
+                 max_wait_ms=5, timeout=30, buckets=None, warm=True):
+        self.backend = backend
+        self.path = path
+        self.num_slots = num_slots
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.timeout = timeout
+        self.buckets = buckets
+        self.warm = warm
+        self.version = None
+        self.warm_up_seconds = 0.0
+        self.pid = None
+        self._owner_pid = None
+
+        num_classes = len(label_map)
+        self._inputs = np.frombuffer(
+            multiprocessing.RawArray('B', num_slots * int(np.prod(IMAGE_SHAPE))),
+            dtype=np.uint8).reshape((num_slots,) + IMAGE_SHAPE)
+        self._outputs = np.frombuffer(
+            multiprocessing.RawArray('f', num_slots * num_classes),
+            dtype=np.float32).reshape(num_slots, num_classes)
+        self._failed = np.frombuffer(multiprocessing.RawArray('B', num_slots), dtype=np.uint8)
+        # 0 = tanpa deadline
+        self._deadlines = np.frombuffer(multiprocessing.RawArray('d', num_slots), dtype=np.float64)
+        self._done = [multiprocessing.Semaphore(0) for _ in range(num_slots)]
+        self._available = multiprocessing.Semaphore(num_slots)
+        self._requests = multiprocessing.SimpleQueue()
+        self._free = multiprocessing.SimpleQueue()
+        for slot in range(num_slots):
+            self._free.put(slot)
+
+    def start(self):
+        """Fork proses server dan tunggu sampai model dimuat dan di-warm-up."""
+        if 'tensorflow' in sys.modules:
+            raise ModelServerError('ModelServer harus di-start sebelum tensorflow di-import')
+        parent_pid = os.getpid()
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            code = 0
+            try:
+                self._serve(parent_pid, ready_write)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+
+        os.close(ready_write)
+        with os.fdopen(ready_read) as ready:
+            message = ready.read()
+        if not message.startswith('ok '):
+            os.waitpid(pid, 0)
+            raise ModelServerError(f'Model server gagal memuat model: {message.strip()}')
+        self.pid = pid
+        self._owner_pid = parent_pid
+        seconds, self.version = message[3:].split(' ', 1)
+        self.warm_up_seconds = float(seconds)
+        return self
+
+    def stop(self):
+        # Hanya proses yang mem-fork server yang boleh menghentikannya
+        if self.pid is None or os.getpid() != self._owner_pid:
+            return
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+            os.waitpid(self.pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        self.pid = None
+
+    @property
+    def full(self):
+        """Semua slot sedang dipakai."""
+        return self._available.get_value() == 0
+
+    def predict(self, images, block=True, deadline=None):
+        outputs = np.empty((len(images), self._outputs.shape[1]), dtype=np.float32)
+        # (indeks gambar, slot) yang sudah dikirim tapi hasilnya belum dibaca
+        pending = collections.deque()
+        status = OK
+        try:
+            for i, image in enumerate(images):
+                # Tanpa slot bebas, hasil gambar sendiri yang sudah terkirim
+                # dibaca dulu dan slotnya dikembalikan: request tidak pernah
+                # menahan slot sambil menunggu slot lain (hold-and-wait)
+                acquired = self._available.acquire(False)
+                while not acquired and pending:
+                    status = max(status, self._receive(*pending.popleft(), outputs))
+                    acquired = self._available.acquire(False)
+                if not acquired:
+                    if not block:
+                        raise QueueFull('Semua slot model server terpakai')
+                    if not self._available.acquire(timeout=self.timeout):
+                        raise ModelServerError('Tidak ada slot model server yang bebas')
+                slot = self._free.get()
+                self._inputs[slot] = image
+                self._deadlines[slot] = deadline or 0.0
+                self._requests.put(slot)
+                pending.append((i, slot))
+            while pending:
+                status = max(status, self._receive(*pending.popleft(), outputs))
+        except BaseException:
+            # Gambar yang sudah terkirim tetap ditunggu agar slotnya aman dipakai ulang
+            for _, slot in pending:
+                if self._done[slot].acquire(timeout=self.timeout):
+                    self._release(slot)
+            raise
+        if status == FAILED:
+            raise ModelServerError('Inferensi gagal di model server')
+        if status == EXPIRED:
+            raise DeadlineExceeded('Deadline request lewat')
+        return outputs
+
+    def _receive(self, index, slot, outputs):
+        """Salin hasil ``slot`` ke ``outputs[index]`` lalu kembalikan slotnya."""
+        if not self._done[slot].acquire(timeout=self.timeout):
+            # Slot dibiarkan terpakai: server mungkin masih menulis ke sana
+            raise ModelServerError('Model server tidak merespons')
+        outputs[index] = self._outputs[slot]
+        status = int(self._failed[slot])
+        self._release(slot)
+        return status
+
+    def _release(self, slot):
+        self._free.put(slot)
+        self._available.release()
+
+    def _serve(self, parent_pid, ready_write):
+        from inference import CascadeEngine, load_engine, warm_up
+
+        with os.fdopen(ready_write, 'w') as ready:
+            try:
+                engine = load_engine(self.backend, self.path)
+                seconds = warm_up(engine, self.buckets) if self.warm and self.buckets else 0.0
+            except Exception as e:
+                ready.write(f'{type(e).__name__}: {e}')
+                raise
+            ready.write(f'ok {seconds} {engine.version}')
+
+        threading.Thread(target=self._watch_parent, args=(parent_pid,),
+                         name='parent-watch', daemon=True).start()
+        padding = self.buckets
+        if isinstance(engine, CascadeEngine):
+            # Cascade mem-pad sendiri per tahap (lihat inference.CascadeEngine)
+            engine.buckets, padding = self.buckets, None
+        batcher = MicroBatcher(lambda batch: engine.predict(engine.prepare(batch)),
+                               max_batch_size=self.max_batch_size,
+                               max_wait_ms=self.max_wait_ms,
+                               buckets=padding)
+        while True:
+            slot = self._requests.get()
+            future = batcher.submit(self._inputs[slot], deadline=self._deadlines[slot] or None)
+            future.add_done_callback(functools.partial(self._finish, slot))
+
+    def _finish(self, slot, future):
+        try:
+            self._outputs[slot] = future.result()
+            self._failed[slot] = OK
+        except DeadlineExceeded:
+            self._failed[slot] = EXPIRED
+        except Exception:
+            traceback.print_exc()
+            self._failed[slot] = FAILED
+        self._done[slot].release()
+
+    @staticmethod
+    def _watch_parent(parent_pid):
+        # Ikut berhenti jika master mati tanpa sempat memanggil stop()
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
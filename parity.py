@@ -0,0 +1,140 @@
+"""Uji paritas akurasi varian TFLite terkuantisasi terhadap densenet201.keras.
+
+Contoh:
+    python parity.py --holdout /content/split_dataset/test
+
+Setiap varian dijalankan pada fixture ``images/`` dan held-out set, lalu
+dibandingkan dengan model referensi: top-1 agreement, drift confidence dan
+speedup. Hasilnya digabung ke laporan JSON yang dibaca ``load_engine`` untuk
+menolak varian yang tidak lolos; entri varian yang tidak diuji ulang tetap
+dipertahankan.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import config
+from inference import (DEFAULT_MODEL_PATHS, QUANTIZED_VARIANTS, KerasEngine,
+                       TFLiteEngine, file_sha256)
+from preprocessing import decode_image, list_images, stratified_sample
+
+
+def run_engine(engine, images):
+    """Prediksi gambar uint8 satu per satu (batch 1, seperti di server), catat latensinya."""
+    inputs = [engine.prepare(image) for image in images]
+    engine.predict(inputs[0])  # pemanasan, tidak dihitung
+    probs, latencies = [], []
+    for x in inputs:
+        start = time.perf_counter()
+        probs.append(engine.predict(x)[0])
+        latencies.append(time.perf_counter() - start)
+    return np.asarray(probs, dtype=np.float32), np.asarray(latencies)
+
+
+def compare(reference, candidate):
+    top1 = reference.argmax(axis=1)
+    rows = np.arange(len(top1))
+    drift = np.abs(reference[rows, top1] - candidate[rows, top1])
+    return {
+        'top1_agreement': float(np.mean(top1 == candidate.argmax(axis=1))),
+        'mean_confidence_drift': float(drift.mean()),
+        'max_confidence_drift': float(drift.max()),
+    }
+
+
+def load_report(path):
+    """Laporan paritas yang sudah ada, atau dict kosong."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reference', default=DEFAULT_MODEL_PATHS['keras'])
+    parser.add_argument('--variants', nargs='*',
+                        help='artefak .tflite yang diuji '
+                             '(bawaan: model/densenet201_<varian>.tflite yang ada)')
+    parser.add_argument('--fixtures', default='images')
+    parser.add_argument('--holdout', help='folder held-out set, mis. split test')
+    parser.add_argument('--limit', type=int, default=500,
+                        help='jumlah maksimum gambar held-out (proporsional per kelas)')
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    parser.add_argument('--max-drift', type=float, default=0.05,
+                        help='batas rata-rata drift confidence kelas top-1')
+    parser.add_argument('--threads', type=int, default=config.TFLITE_THREADS)
+    parser.add_argument('--report', default=config.PARITY_REPORT)
+    args = parser.parse_args(argv)
+
+    variants = args.variants
+    if variants is None:
+        model_dir = os.path.dirname(args.reference)
+        variants = [os.path.join(model_dir, f'densenet201_{v}.tflite')
+                    for v in QUANTIZED_VARIANTS]
+        variants = [path for path in variants if os.path.exists(path)]
+    if not variants:
+        parser.error('tidak ada varian terkuantisasi untuk diuji')
+
+    paths = list_images(args.fixtures)
+    if args.holdout:
+        # Held-out set per folder kelas: sampel proporsional, bukan kelas pertama saja
+        paths += stratified_sample(list_images(args.holdout), args.limit, key=os.path.dirname)
+    if not paths:
+        parser.error('tidak ada gambar untuk diuji')
+    inputs = [decode_image(path) for path in paths]
+    print(f"{len(inputs)} gambar ({args.fixtures}"
+          f"{' + ' + args.holdout if args.holdout else ''})")
+
+    reference_probs, reference_latency = run_engine(
+        KerasEngine(args.reference), inputs)
+    reference_ms = float(np.median(reference_latency) * 1000)
+
+    # Konteks run ini; disalin ke setiap entri karena laporan bisa berisi
+    # varian dari run berbeda
+    run = {
+        'reference': os.path.basename(args.reference),
+        'num_images': len(inputs),
+        'holdout': args.holdout,
+        'thresholds': {'min_agreement': args.min_agreement,
+                       'max_mean_drift': args.max_drift},
+        'reference_latency_ms': reference_ms,
+    }
+    report = load_report(args.report)
+    report.update(run, variants=report.get('variants', {}))
+    tested = {}
+    for path in variants:
+        probs, latency = run_engine(
+            TFLiteEngine(path, num_threads=args.threads), inputs)
+        entry = compare(reference_probs, probs)
+        entry['latency_ms'] = float(np.median(latency) * 1000)
+        entry['speedup'] = reference_ms / entry['latency_ms']
+        entry['size_mb'] = os.path.getsize(path) / 1e6
+        entry['sha256'] = file_sha256(path)
+        entry['passed'] = (entry['top1_agreement'] >= args.min_agreement
+                           and entry['mean_confidence_drift'] <= args.max_drift)
+        entry['tested'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        entry.update(run)
+        tested[os.path.basename(path)] = entry
+        print(f"{os.path.basename(path):28s} agreement={entry['top1_agreement']:.4f} "
+              f"drift={entry['mean_confidence_drift']:.4f} "
+              f"(max {entry['max_confidence_drift']:.4f}) "
+              f"speedup={entry['speedup']:.2f}x "
+              f"{'LOLOS' if entry['passed'] else 'GAGAL'}")
+
+    report['variants'].update(tested)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    kept = len(report['variants']) - len(tested)
+    print(f"Laporan ditulis ke {args.report}"
+          f"{f' ({kept} varian lama dipertahankan)' if kept else ''}")
+    return 0 if all(v['passed'] for v in tested.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
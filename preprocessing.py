@@ -0,0 +1,86 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+
+TARGET_SIZE = (224, 224)  # ukuran untuk CNN
+# Scaling input saat training: ``rescale`` = x / 255 seperti
+# ImageDataGenerator(rescale=1./255) di notebook (densenet201.keras),
+# ``densenet`` = preprocess_input DenseNet (x / 255 lalu mean/std ImageNet)
+SCALINGS = ('rescale', 'densenet')
+
+
+def decode_image(source, target_size=TARGET_SIZE):
+    """Decode bytes / file-like / path menjadi array uint8 (H, W, 3).
+
+    Untuk JPEG, draft mode membuat libjpeg langsung men-decode pada skala
+    1/2, 1/4 atau 1/8 (domain DCT) yang masih >= ``target_size``, sehingga
+    foto 12 MP tidak pernah di-decode pada resolusi penuh. Resize akhir
+    memakai nearest seperti ``load_img`` saat training.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        img.draft('RGB', target_size)
+        img = img.convert('RGB')
+        if img.size != target_size:
+            img = img.resize(target_size, Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def preprocess(images, scaling='densenet'):
+    """uint8 (H, W, 3) atau (N, H, W, 3) -> batch float32 siap untuk model."""
+    if scaling not in SCALINGS:
+        raise ValueError(f"Scaling tidak dikenal: {scaling!r} (pilih salah satu dari {SCALINGS})")
+    batch = np.asarray(images, dtype=np.float32)
+    if batch.ndim == 3:
+        batch = batch[np.newaxis]
+    if scaling == 'rescale':
+        return batch / 255.0
+    # Import di sini agar proses decode (mis. worker classify.py) tidak
+    # perlu memuat tensorflow
+    from tensorflow.keras.applications.densenet import preprocess_input
+    return preprocess_input(batch)
+
+
+def extract_features(source):
+    return preprocess(decode_image(source))  # (1, 224, 224, 3)
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_images(root):
+    """Semua file gambar di bawah ``root`` (rekursif, urutan stabil)."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(dirpath, name))
+    return paths
+
+
+def stratified_sample(items, limit, key, seed=0):
+    """Maksimal ``limit`` item dengan proporsi per kelas ``key(item)`` seperti semua item.
+
+    Item dalam setiap kelas diacak dengan ``seed`` (stabil antar run), jadi
+    ``[:limit]`` dari daftar berurutan per folder kelas tidak lagi hanya
+    mengambil kelas-kelas pertama.
+    """
+    if limit is None or len(items) <= limit:
+        return list(items)
+    rng = np.random.default_rng(seed)
+    groups = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    # Urutkan menurut posisi relatif dalam kelasnya: setiap prefiks berisi
+    # semua kelas secara proporsional
+    ranked = []
+    for group in groups.values():
+        for rank, index in enumerate(rng.permutation(len(group))):
+            ranked.append(((rank + 0.5) / len(group), group[index]))
+    ranked.sort(key=lambda pair: pair[0])
+    return [item for _, item in ranked[:limit]]
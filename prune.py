@@ -0,0 +1,322 @@
+"""Pruning struktural densenet201.keras: conv block DenseNet dan channel head.
+
+Contoh:
+    python prune.py --data /content/split_dataset --block-keep 0.75 --head-keep 0.5
+
+Dua tahap pemangkasan, lalu fine-tuning untuk memulihkan akurasi:
+
+* Backbone: setiap conv block di dense block menambahkan 32 channel yang
+  dibaca oleh BatchNorm semua layer sesudahnya. Pentingnya sebuah conv
+  block adalah rata-rata |gamma| BatchNorm konsumennya pada 32 channel
+  tersebut (dinormalisasi per layer, seperti network slimming). Conv block
+  dengan nilai terendah dibuang (minimal satu per dense block tersisa) dan
+  input layer sesudahnya diiris sesuai channel yang tersisa.
+* Head: filter Conv2D dan unit Dense tersembunyi diurutkan menurut norma
+  L1 bobotnya; hanya ``--head-keep`` teratas yang disimpan, dan input
+  layer berikutnya diiris. Layer output 8 kelas tidak disentuh.
+
+Model hasil tetap Sequential [backbone, head...] dengan layer Keras
+standar, jadi bisa langsung dimuat server lewat ``MANGALYZE_MODEL_PATH``
+(dan feature_store.split_model). FLOPs, jumlah parameter, latensi CPU dan
+akurasi dibandingkan dengan model asli di ``--report``.
+
+Fine-tuning dan evaluasi kedua model memakai scaling input saat model
+asli dilatih (``--scaling``, bawaan ``rescale`` seperti notebook); model
+hasil mewarisi scaling yang sama (lihat export_serving.py).
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+
+from benchmark import measure
+from feature_store import AUGMENTATION, samples_from_directory
+from inference import KerasEngine
+from preprocessing import SCALINGS, TARGET_SIZE, decode_image, stratified_sample
+
+
+GROWTH_RATE = 32
+_CONCAT = re.compile(r'^conv(\d)_block(\d+)_concat$')
+
+
+def _clone(layer, **overrides):
+    return layer.__class__.from_config(dict(layer.get_config(), **overrides))
+
+
+def _sliced_bn(layer, channels):
+    new = _clone(layer)
+    new.build((None, None, None, len(channels)))
+    new.set_weights([w[channels] for w in layer.get_weights()])
+    return new
+
+
+def _sliced_conv(layer, channels):
+    """Conv2D dengan channel input ``channels`` saja (jumlah filter tetap)."""
+    new = _clone(layer)
+    new.build((None, None, None, len(channels)))
+    weights = layer.get_weights()
+    new.set_weights([weights[0][:, :, channels, :]] + weights[1:])
+    return new
+
+
+def dense_blocks(backbone):
+    """{stage: jumlah conv block} dari nama layer DenseNet Keras (conv2..conv5)."""
+    blocks = {}
+    for layer in backbone.layers:
+        match = _CONCAT.match(layer.name)
+        if match:
+            stage, block = int(match.group(1)), int(match.group(2))
+            blocks[stage] = max(blocks.get(stage, 0), block)
+    if not blocks:
+        raise ValueError(f'{backbone.name}: bukan backbone DenseNet Keras')
+    return dict(sorted(blocks.items()))
+
+
+def _consumer_bns(backbone, stage, num_blocks):
+    consumers = [backbone.get_layer(f'conv{stage}_block{k}_0_bn') for k in range(2, num_blocks + 1)]
+    if stage == max(dense_blocks(backbone)):
+        return consumers + [backbone.get_layer('bn')]
+    return consumers + [backbone.get_layer(f'pool{stage}_bn')]
+
+
+def block_importance(backbone):
+    """{(stage, block): skor} - rata-rata |gamma| BatchNorm yang membaca output block."""
+    scores = {}
+    for stage, num_blocks in dense_blocks(backbone).items():
+        first_channels = backbone.get_layer(f'conv{stage}_block1_0_bn').get_weights()[0].shape[0]
+        gammas = []
+        for bn in _consumer_bns(backbone, stage, num_blocks):
+            gamma = np.abs(bn.get_weights()[0])
+            gammas.append(gamma / gamma.mean())
+        for block in range(1, num_blocks + 1):
+            start = first_channels + GROWTH_RATE * (block - 1)
+            # Konsumen block k: bn0 block k+1.. dan transisi/bn akhir
+            readers = [g[start:start + GROWTH_RATE] for g in gammas[block - 1:]]
+            scores[(stage, block)] = float(np.mean([r.mean() for r in readers]))
+    return scores
+
+
+def select_blocks(backbone, keep_fraction):
+    """{stage: [block yang disimpan]} berdasarkan block_importance."""
+    scores = block_importance(backbone)
+    blocks = dense_blocks(backbone)
+    keep = max(len(blocks), math.ceil(keep_fraction * len(scores)))
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    kept = {stage: {max(range(1, n + 1), key=lambda b: scores[(stage, b)])}
+            for stage, n in blocks.items()}
+    for stage, block in ranked:
+        if sum(map(len, kept.values())) >= keep:
+            break
+        kept[stage].add(block)
+    return {stage: sorted(blocks_) for stage, blocks_ in kept.items()}
+
+
+def prune_backbone(backbone, kept_blocks):
+    """Bangun ulang DenseNet hanya dengan ``kept_blocks``; kembalikan (model, channel output asli)."""
+    blocks = dense_blocks(backbone)
+    inputs = tf.keras.Input(backbone.input.shape[1:])
+    x = inputs
+    # Stem (conv1 + pool1) dipakai apa adanya
+    for layer in backbone.layers[1:]:
+        if layer.name.startswith('conv2_block1_'):
+            break
+        x = layer(x)
+
+    for stage, num_blocks in blocks.items():
+        channels = np.arange(x.shape[-1])
+        first_channels = len(channels)
+        for block in kept_blocks[stage]:
+            name = f'conv{stage}_block{block}'
+            y = _sliced_bn(backbone.get_layer(f'{name}_0_bn'), channels)(x)
+            y = _clone(backbone.get_layer(f'{name}_0_relu'))(y)
+            y = _sliced_conv(backbone.get_layer(f'{name}_1_conv'), channels)(y)
+            for suffix in ('_1_bn', '_1_relu', '_2_conv'):
+                source = backbone.get_layer(name + suffix)
+                new = _clone(source)
+                new.build(source.input.shape)
+                new.set_weights(source.get_weights())
+                y = new(y)
+            x = _clone(backbone.get_layer(f'{name}_concat'))([x, y])
+            start = first_channels + GROWTH_RATE * (block - 1)
+            channels = np.concatenate([channels, np.arange(start, start + GROWTH_RATE)])
+
+        if stage == max(blocks):
+            x = _sliced_bn(backbone.get_layer('bn'), channels)(x)
+            x = _clone(backbone.get_layer('relu'))(x)
+        else:
+            x = _sliced_bn(backbone.get_layer(f'pool{stage}_bn'), channels)(x)
+            x = _clone(backbone.get_layer(f'pool{stage}_relu'))(x)
+            x = _sliced_conv(backbone.get_layer(f'pool{stage}_conv'), channels)(x)
+            x = _clone(backbone.get_layer(f'pool{stage}_pool'))(x)
+    return tf.keras.Model(inputs, x, name=f'{backbone.name}_pruned'), channels
+
+
+def prune_head(head_layers, input_channels, keep_fraction):
+    """Layer head baru: filter/unit dengan norma L1 terbesar, input diiris ke ``input_channels``."""
+    weighted = [i for i, layer in enumerate(head_layers) if isinstance(layer, (layers.Conv2D, layers.Dense))]
+    output_index = weighted[-1]
+    new_layers, channels = [], np.asarray(input_channels)
+    for i, layer in enumerate(head_layers):
+        if not isinstance(layer, (layers.Conv2D, layers.Dense)):
+            new_layers.append(_clone(layer))
+            continue
+        kernel, bias = layer.get_weights()
+        kernel = kernel[..., channels, :]
+        size = kernel.shape[-1]
+        if i == output_index:
+            keep = np.arange(size)
+        else:
+            norms = np.abs(kernel).reshape(-1, size).sum(axis=0)
+            keep = np.sort(np.argsort(norms)[::-1][:max(1, math.ceil(keep_fraction * size))])
+        if isinstance(layer, layers.Conv2D):
+            new = _clone(layer, filters=len(keep))
+            new.build((None, None, None, len(channels)))
+        else:
+            new = _clone(layer, units=len(keep))
+            new.build((None, len(channels)))
+        new.set_weights([kernel[..., keep], bias[keep]])
+        new_layers.append(new)
+        channels = keep
+    return new_layers
+
+
+def prune_model(model, block_keep=0.75, head_keep=0.5):
+    """Model Sequential notebook [DenseNet201, head...] -> model terpangkas."""
+    backbone = model.layers[0]
+    kept_blocks = select_blocks(backbone, block_keep)
+    pruned_backbone, channels = prune_backbone(backbone, kept_blocks)
+    head = prune_head(model.layers[1:], channels, head_keep)
+    pruned = tf.keras.Sequential([tf.keras.Input(backbone.input.shape[1:]), pruned_backbone] + head,
+                                 name=f'{model.name}_pruned')
+    return pruned, kept_blocks
+
+
+def model_flops(model):
+    """FLOPs per gambar menurut profiler TensorFlow (graph model pada batch 1)."""
+    fn = tf.function(lambda x: model(x, training=False))
+    graph = fn.get_concrete_function(
+        tf.TensorSpec((1,) + TARGET_SIZE + (3,), tf.float32)).graph
+    options = tf.compat.v1.profiler.ProfileOptionBuilder(
+        tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()).with_empty_output().build()
+    return int(tf.compat.v1.profiler.profile(graph=graph, options=options).total_float_ops)
+
+
+def fine_tune(model, data_dir, epochs, batch_size, learning_rate, callbacks=None,
+              scaling='rescale'):
+    """Latih ulang seluruh model; BatchNorm tetap dalam mode inferensi."""
+    from tensorflow.keras.applications.densenet import preprocess_input
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    for layer in model.layers[0].layers:
+        layer.trainable = not isinstance(layer, layers.BatchNormalization)
+    # Scaling sama dengan saat model asli dilatih
+    scale = ({'rescale': 1. / 255} if scaling == 'rescale'
+             else {'preprocessing_function': preprocess_input})
+    train = ImageDataGenerator(**scale, **AUGMENTATION).flow_from_directory(
+        os.path.join(data_dir, 'train'), target_size=TARGET_SIZE, batch_size=batch_size,
+        class_mode='categorical', shuffle=True)
+    val = ImageDataGenerator(**scale).flow_from_directory(
+        os.path.join(data_dir, 'val'), target_size=TARGET_SIZE, batch_size=batch_size,
+        class_mode='categorical', shuffle=False)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+                  loss='categorical_crossentropy', metrics=['accuracy'])
+    return model.fit(train, validation_data=val, epochs=epochs, callbacks=callbacks)
+
+
+def profile(path, inputs, labels, batch_sizes, repeats, scaling='rescale'):
+    engine = KerasEngine(path)
+    engine.scaling = scaling
+    probs = np.concatenate([engine.predict(engine.prepare(x)) for x in inputs])
+    entry = {
+        'params': int(engine.model.count_params()),
+        'flops': model_flops(engine.model),
+        'size_mb': os.path.getsize(path) / 1e6,
+        'accuracy': float(np.mean(probs.argmax(axis=1) == labels)),
+        'latency_ms': {},
+    }
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        batch = engine.prepare(rng.integers(0, 256, (batch_size,) + TARGET_SIZE + (3,), dtype=np.uint8))
+        entry['latency_ms'][str(batch_size)] = float(
+            np.median(measure(lambda: engine.predict(batch), repeats)) * 1000)
+    return entry, probs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='model/densenet201.keras')
+    parser.add_argument('--data', required=True, help='folder split berisi train/, val/, test/')
+    parser.add_argument('--scaling', choices=SCALINGS, default='rescale',
+                        help='scaling input saat model asli dilatih (lihat export_serving.py)')
+    parser.add_argument('--block-keep', type=float, default=0.75,
+                        help='fraksi conv block DenseNet yang disimpan')
+    parser.add_argument('--head-keep', type=float, default=0.5,
+                        help='fraksi filter/unit head yang disimpan')
+    parser.add_argument('--epochs', type=int, default=5, help='epoch fine-tuning (0 = tanpa)')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--learning-rate', type=float, default=1e-5)
+    parser.add_argument('--limit', type=int, default=500,
+                        help='jumlah maksimum gambar test untuk evaluasi (proporsional per kelas)')
+    parser.add_argument('--latency-batch-sizes', type=int, nargs='*', default=(1, 8))
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--output', help='bawaan: <model>_pruned.keras')
+    parser.add_argument('--report', default='model/prune_report.json')
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.model)[0] + '_pruned.keras'
+    model = tf.keras.models.load_model(args.model)
+    pruned, kept_blocks = prune_model(model, args.block_keep, args.head_keep)
+    for stage, blocks in kept_blocks.items():
+        print(f'conv{stage}: {len(blocks)}/{dense_blocks(model.layers[0])[stage]} conv block disimpan')
+    history = None
+    if args.epochs:
+        history = fine_tune(pruned, args.data, args.epochs, args.batch_size, args.learning_rate,
+                            callbacks=[tf.keras.callbacks.EarlyStopping(
+                                monitor='val_loss', patience=2, restore_best_weights=True)],
+                            scaling=args.scaling)
+        # Kompilasi ulang agar state optimizer fine-tuning tidak ikut tersimpan
+        pruned.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=args.learning_rate),
+                       loss='categorical_crossentropy', metrics=['accuracy'])
+    pruned.save(output)
+
+    test_samples = stratified_sample(samples_from_directory(os.path.join(args.data, 'test')),
+                                     args.limit, key=lambda sample: sample[1])
+    inputs = [decode_image(path) for path, _ in test_samples]
+    labels = np.array([label for _, label in test_samples])
+    original, original_probs = profile(args.model, inputs, labels,
+                                       args.latency_batch_sizes, args.repeats, args.scaling)
+    result, pruned_probs = profile(output, inputs, labels, args.latency_batch_sizes, args.repeats,
+                                   args.scaling)
+    result['agreement'] = float(np.mean(pruned_probs.argmax(axis=1) == original_probs.argmax(axis=1)))
+
+    report = {
+        'original': dict(original, path=args.model),
+        'pruned': dict(result, path=output, kept_blocks={f'conv{s}': b for s, b in kept_blocks.items()},
+                       epochs_trained=len(history.history['loss']) if history else 0),
+        'block_keep': args.block_keep,
+        'head_keep': args.head_keep,
+        'scaling': args.scaling,
+        'num_test_images': len(inputs),
+    }
+    for name in ('original', 'pruned'):
+        entry = report[name]
+        latency = ' '.join(f'b{b}={ms:.1f}ms' for b, ms in entry['latency_ms'].items())
+        print(f"{name:8s} {entry['flops'] / 1e9:6.2f} GFLOPs {entry['params'] / 1e6:6.2f}M param "
+              f"{entry['size_mb']:6.1f}MB akurasi={entry['accuracy']:.4f} {latency}")
+    print(f"Agreement dengan model asli: {result['agreement']:.4f}; model ditulis ke {output}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Laporan ditulis ke {args.report}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Ekspor varian TFLite terkuantisasi dari SavedModel densenet201.
+
+Dipanggil dari bagian "Konversi Model" di notebook, lalu diverifikasi
+dengan parity.py sebelum boleh dimuat server.
+"""
+import os
+import random
+
+import tensorflow as tf
+
+from inference import QUANTIZED_VARIANTS
+from preprocessing import extract_features, list_images
+
+
+def representative_dataset(train_dir, num_samples=200, seed=0):
+    """Sampel acak dari split train, dengan preprocessing yang sama seperti server."""
+    paths = list_images(train_dir)
+    random.Random(seed).shuffle(paths)
+    paths = paths[:num_samples]
+
+    def generator():
+        for path in paths:
+            yield [extract_features(path)]
+    return generator
+
+
+def convert_variant(saved_model_dir, variant, representative_data=None):
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'int8':
+        if representative_data is None:
+            raise ValueError('Kuantisasi int8 membutuhkan representative dataset')
+        converter.representative_dataset = representative_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif variant != 'dynamic':
+        raise ValueError(f"Varian tidak dikenal: {variant!r}")
+    return converter.convert()
+
+
+def export_quantized_variants(saved_model_dir, out_dir, train_dir,
+                              variants=QUANTIZED_VARIANTS, num_samples=200):
+    """Tulis ``densenet201_<varian>.tflite`` ke ``out_dir``, kembalikan path-nya."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for variant in variants:
+        representative_data = None
+        if variant == 'int8':
+            representative_data = representative_dataset(train_dir, num_samples)
+        tflite_model = convert_variant(saved_model_dir, variant, representative_data)
+        path = os.path.join(out_dir, f'densenet201_{variant}.tflite')
+        with open(path, 'wb') as f:
+            f.write(tflite_model)
+        paths[variant] = path
+        print(f"{variant}: {path} ({len(tflite_model) / 1e6:.1f} MB)")
+    return paths
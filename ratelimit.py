@@ -0,0 +1,44 @@
+"""Rate limit per klien dengan token bucket (dipakai service.admit)."""
+import collections
+import threading
+import time
+
+
+class RateLimited(Exception):
+    """Klien melewati rate limit; ``retry_after`` = detik sampai token berikutnya."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Rate limit terlampaui, coba lagi dalam {retry_after:.2f} detik')
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket per klien: ``rate`` token per detik, maksimum ``burst``.
+
+    Hanya ``max_clients`` bucket yang disimpan (LRU); bucket klien yang
+    dibuang mulai penuh lagi saat klien itu kembali.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000, clock=time.monotonic):
+        if rate <= 0 or burst < 1:
+            raise ValueError('rate harus > 0 dan burst >= 1')
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.clock = clock
+        # klien -> (token tersisa, waktu update)
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client, tokens=1):
+        """Ambil ``tokens`` dari bucket ``client`` atau lempar ``RateLimited``."""
+        now = self.clock()
+        with self._lock:
+            available, updated = self._buckets.pop(client, (self.burst, now))
+            available = min(self.burst, available + (now - updated) * self.rate)
+            allowed = available >= tokens
+            self._buckets[client] = (available - tokens if allowed else available, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            raise RateLimited((tokens - available) / self.rate)
@@ -0,0 +1,495 @@
+"""Jalur prediksi bersama untuk mode Flask (main.py) dan ASGI (asgi.py)."""
+import atexit
+import math
+import sys
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+import config
+import metrics
+from batching import DeadlineExceeded, MicroBatcher, QueueFull
+from cache import PredictionCache, content_hash
+from history import PredictionHistory
+from inference import CascadeEngine, load_engine, serving_buckets, warm_up
+from labels import label_map, recommendation_map
+from model_server import ModelServer
+from preprocessing import TARGET_SIZE, decode_image, IMAGE_EXTENSIONS
+from ratelimit import RateLimited, RateLimiter
+from storage import UploadStore
+
+
+# Semua ukuran batch yang sampai ke model (micro-batch POST / dan chunk
+# POST /batch) di-pad ke salah satu bucket ini, dan hanya bucket ini
+# yang di-warm-up
+buckets = serving_buckets()
+# /ready baru 200 setelah warm-up selesai
+ready = threading.Event()
+first_request_done = threading.Event()
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def finish_warm_up(seconds):
+    metrics.WARMUP_SECONDS.set(seconds)
+    if config.WARM_UP:
+        log(f"Warm-up batch {list(buckets)} selesai dalam {seconds:.2f}s")
+    ready.set()
+
+engine = batcher = model_server = None
+if config.MODEL_SERVER:
+    # Model dimuat di proses terpisah yang dipakai bersama semua worker
+    model_server = ModelServer(num_slots=config.MODEL_SERVER_SLOTS,
+                               max_batch_size=config.MAX_BATCH_SIZE,
+                               max_wait_ms=config.MAX_BATCH_WAIT_MS,
+                               buckets=buckets, warm=config.WARM_UP).start()
+    atexit.register(model_server.stop)
+    model_version = model_server.version
+    finish_warm_up(model_server.warm_up_seconds)
+else:
+    engine = load_engine()
+    batch_padding = buckets
+    if isinstance(engine, CascadeEngine):
+        # Cascade mem-pad sendiri per tahap agar baris padding tidak dieskalasi
+        engine.buckets, engine.on_result = buckets, metrics.observe_cascade
+        batch_padding = None
+    batcher = MicroBatcher(engine.predict,
+                           max_batch_size=config.MAX_BATCH_SIZE,
+                           max_wait_ms=config.MAX_BATCH_WAIT_MS,
+                           on_batch=metrics.BATCH_SIZE.observe,
+                           buckets=batch_padding,
+                           max_queue=config.MAX_QUEUE_DEPTH)
+    metrics.QUEUE_DEPTH.set_function(lambda: batcher.queue_depth)
+    model_version = engine.version
+    # Warm-up di background agar /live sudah menjawab selama model dipanaskan
+    threading.Thread(
+        target=lambda: finish_warm_up(warm_up(engine, buckets) if config.WARM_UP else 0.0),
+        name='warm-up', daemon=True).start()
+prediction_cache = PredictionCache(max_entries=config.CACHE_MAX_ENTRIES,
+                                   ttl_seconds=config.CACHE_TTL_SECONDS,
+                                   path=config.CACHE_PATH)
+
+history = None
+if config.HISTORY_PATH:
+    history = PredictionHistory(config.HISTORY_PATH,
+                                batch_size=config.HISTORY_BATCH_SIZE,
+                                flush_seconds=config.HISTORY_FLUSH_SECONDS,
+                                max_pending=config.HISTORY_MAX_PENDING,
+                                on_drop=metrics.HISTORY_DROPPED.inc)
+    metrics.HISTORY_PENDING.set_function(lambda: history.pending)
+    atexit.register(history.close)
+# Jendela bawaan GET /history dan /history/stats
+HISTORY_WINDOW_SECONDS = 7 * 86400
+
+rate_limiter = (RateLimiter(config.RATE_LIMIT_PER_SECOND, config.RATE_LIMIT_BURST)
+                if config.RATE_LIMIT_PER_SECOND > 0 else None)
+# Request yang ditolak admission control (lihat ``rejection``)
+ADMISSION_ERRORS = (RateLimited, QueueFull, DeadlineExceeded)
+TIMEOUT_HEADER = 'X-Request-Timeout-Ms'
+
+# Upload disimpan per hash isi di uploads/ab/cd/ (lihat storage.py) dan
+# disajikan di /uploads; bukan di images/, yang juga sumber fixture
+# parity/benchmark (preprocessing.list_images)
+UPLOAD_FOLDER = 'uploads'
+# Metadata upload (nama file asli) di luar folder yang disajikan publik
+UPLOAD_METADATA_FOLDER = 'uploads_metadata'
+upload_store = UploadStore(UPLOAD_FOLDER,
+                           max_bytes=config.UPLOAD_MAX_MB * 1024 * 1024,
+                           max_age_seconds=config.UPLOAD_MAX_AGE_DAYS * 86400,
+                           on_evict=metrics.observe_eviction,
+                           preview_sizes=config.PREVIEW_SIZES,
+                           preview_format=config.PREVIEW_FORMAT,
+                           metadata_root=UPLOAD_METADATA_FOLDER)
+if config.SAVE_UPLOADS:
+    upload_store.start_evictor(config.UPLOAD_EVICT_INTERVAL_SECONDS)
+# Penyimpanan file asli + preview dilakukan di luar jalur request; antrean
+# dibatasi UPLOAD_MAX_PENDING agar bytes upload yang menunggu tidak menumpuk
+upload_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-writer')
+upload_slots = threading.BoundedSemaphore(config.UPLOAD_MAX_PENDING)
+# Upload yang belum selesai ditulis; request preview menunggunya
+pending_uploads = {}
+pending_uploads_lock = threading.Lock()
+# Nama preview berisi hash isi, jadi isinya tidak pernah berubah
+PREVIEW_MAX_AGE = 365 * 86400
+
+# POST / dengan Content-Type application/octet-stream: piksel RGB mentah
+RAW_CONTENT_TYPE = 'application/octet-stream'
+RAW_SHAPE = TARGET_SIZE + (3,)
+RAW_SIZE = int(np.prod(RAW_SHAPE))
+
+# Batas satu request POST /batch (lihat config.BATCH_MAX_FILES); field
+# non-file (plot) dihitung terpisah dari file
+BATCH_MAX_BYTES = config.BATCH_MAX_MB * 1024 * 1024
+BATCH_MAX_FIELDS = 8
+
+def describe_prediction(probs):
+    predicted_label = int(np.argmax(probs))
+    label_name = label_map[predicted_label]
+    confidence = float(probs[predicted_label] * 100)
+    recommendation = recommendation_map.get(label_name, "Tidak ada rekomendasi khusus.")
+    return label_name, confidence, recommendation
+
+def client_upload_settings():
+    """Variabel template index.html untuk downscale gambar di browser."""
+    return {"max_dimension": config.CLIENT_MAX_DIMENSION,
+            "jpeg_quality": config.CLIENT_JPEG_QUALITY}
+
+def store_upload(data, filename):
+    """Simpan upload di background; kembalikan path relatifnya di store.
+
+    ``None`` jika antrean tulis penuh (upload tidak disimpan).
+    """
+    if not upload_slots.acquire(blocking=False):
+        metrics.UPLOADS_SKIPPED.inc()
+        return None
+    relative_path = upload_store.path_for(data, filename)
+    try:
+        future = upload_writer.submit(upload_store.save, data, filename, relative_path)
+    except RuntimeError:
+        # Executor sudah dimatikan (proses berhenti)
+        upload_slots.release()
+        return None
+    with pending_uploads_lock:
+        pending_uploads[relative_path] = future
+    future.add_done_callback(lambda done: upload_finished(relative_path, done))
+    return relative_path
+
+def upload_finished(relative_path, future):
+    upload_slots.release()
+    with pending_uploads_lock:
+        # Upload ulang isi yang sama bisa sudah mendaftarkan future baru
+        if pending_uploads.get(relative_path) is future:
+            del pending_uploads[relative_path]
+
+def preview_urls(relative_path):
+    return {str(size): f"/previews/{size}/{relative_path}" for size in upload_store.preview_sizes}
+
+def preview_file(relative_path, size):
+    """Path file preview (dibuat jika belum ada), atau None jika tidak ditemukan."""
+    future = pending_uploads.get(relative_path)
+    if future is not None:
+        try:
+            future.result(timeout=10)
+        except Exception:
+            return None
+    try:
+        return upload_store.preview(relative_path, size)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+def client_id(headers, remote_addr):
+    """Identitas klien untuk rate limit."""
+    if config.CLIENT_ID_HEADER:
+        # X-Forwarded-For: alamat klien asli adalah entri pertama
+        value = headers.get(config.CLIENT_ID_HEADER, '').split(',')[0].strip()
+        if value:
+            return value
+    return remote_addr
+
+def admit(client):
+    """Lempar RateLimited jika ``client`` melewati rate limit."""
+    if rate_limiter is not None:
+        rate_limiter.acquire(client)
+
+def request_deadline(timeout_header=None):
+    """Deadline ``time.monotonic()`` untuk request yang baru diterima, atau None."""
+    timeout_ms = config.REQUEST_TIMEOUT_MS
+    try:
+        requested = float(timeout_header) if timeout_header else 0
+    except ValueError:
+        requested = 0
+    if requested > 0:
+        timeout_ms = min(timeout_ms, requested) if timeout_ms > 0 else requested
+    return time.monotonic() + timeout_ms / 1000 if timeout_ms > 0 else None
+
+def check_capacity():
+    """Lempar QueueFull jika antrean inferensi sudah penuh (sebelum /batch di-stream)."""
+    if (model_server if model_server is not None else batcher).full:
+        raise QueueFull('Antrean inferensi penuh')
+
+def check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded('Deadline request lewat')
+
+def rejection(error, endpoint):
+    """(payload JSON, status HTTP, header) untuk request yang ditolak."""
+    if isinstance(error, DeadlineExceeded):
+        metrics.DEADLINE_EXCEEDED.inc()
+        metrics.REQUESTS.labels(endpoint, 'deadline_exceeded').inc()
+        return {"success": False, "error": "Waktu pemrosesan request habis."}, 504, {}
+    if isinstance(error, RateLimited):
+        reason, status, retry_after = 'rate_limited', 429, math.ceil(error.retry_after)
+        message = "Terlalu banyak request, coba lagi nanti."
+    else:
+        reason, status, retry_after = 'queue_full', 503, config.QUEUE_RETRY_AFTER_SECONDS
+        message = "Server sedang sibuk, coba lagi nanti."
+    metrics.SHED.labels(reason).inc()
+    metrics.REQUESTS.labels(endpoint, reason).inc()
+    return {"success": False, "error": message}, status, {'Retry-After': str(retry_after)}
+
+def after_fork():
+    """Dipanggil di worker setelah fork dari master (gunicorn.conf.py)."""
+    prediction_cache.reopen()
+
+def run_model(data, deadline=None):
+    check_deadline(deadline)
+    with metrics.STAGE['decode'].time():
+        image = decode_image(data)
+    return run_image(image, deadline)
+
+def run_image(image, deadline=None):
+    """Probabilitas untuk satu gambar uint8 (224, 224, 3).
+
+    Melempar QueueFull jika antrean inferensi penuh dan DeadlineExceeded
+    jika ``deadline`` lewat sebelum gambar sampai ke model.
+    """
+    if model_server is not None:
+        # Preprocessing ikut dijalankan di proses model server
+        with metrics.STAGE['inference'].time():
+            return model_server.predict(image[np.newaxis], block=False, deadline=deadline)[0]
+    with metrics.STAGE['preprocess'].time():
+        batch = engine.prepare(image)
+    with metrics.STAGE['inference'].time():
+        return batcher.predict(batch, deadline)[0]
+
+def record_history(data, probs, label_name, cache_hit, seconds, plot=None):
+    if history is not None:
+        history.record(content_hash(data), label_name, probs, model_version,
+                       seconds * 1000, cache_hit, plot)
+
+def prediction_response(data, probs, cache_hit, start, plot=None, image_url=None, previews=None):
+    metrics.CACHE.labels('hit' if cache_hit else 'miss').inc()
+    if not first_request_done.is_set():
+        first_request_done.set()
+        seconds = time.perf_counter() - start
+        metrics.FIRST_REQUEST_SECONDS.set(seconds)
+        log(f"Request prediksi pertama: {seconds * 1000:.1f}ms")
+
+    label_name, confidence, recommendation = describe_prediction(probs)
+    metrics.observe_prediction(label_name, confidence / 100)
+    metrics.REQUESTS.labels('predict', 'ok').inc()
+    record_history(data, probs, label_name, cache_hit, time.perf_counter() - start, plot)
+    return {
+        "success": True,
+        "prediction": f"{label_name} ({confidence:.2f}%)",
+        "recommendation": recommendation,
+        "image_url": image_url,
+        "preview_urls": previews or {},
+        "cache": "hit" if cache_hit else "miss"
+    }
+
+def predict_upload(data, filename, deadline=None, plot=None):
+    """Payload JSON POST / untuk satu upload."""
+    start = time.perf_counter()
+    try:
+        probs, cache_hit = prediction_cache.get_or_compute(
+            data, model_version, lambda: run_model(data, deadline))
+    except (UnidentifiedImageError, OSError):
+        metrics.REQUESTS.labels('predict', 'invalid_image').inc()
+        return {
+            "success": False,
+            "error": "File bukan gambar yang valid."
+        }
+
+    image_url, previews = None, {}
+    relative_path = store_upload(data, filename) if config.SAVE_UPLOADS else None
+    if relative_path is not None:
+        previews = preview_urls(relative_path)
+        # Preview terbesar untuk tampilan hasil, bukan file asli beresolusi penuh
+        image_url = previews[str(max(upload_store.preview_sizes))] if previews \
+            else f"/uploads/{relative_path}"
+    return prediction_response(data, probs, cache_hit, start, plot, image_url, previews)
+
+def predict_raw(data, deadline=None, plot=None):
+    """Payload JSON POST / untuk tensor mentah 224x224x3 uint8 (tanpa decode/resize).
+
+    Klien bertanggung jawab me-resize (nearest, seperti load_img saat
+    training); tidak ada file yang disimpan.
+    """
+    if len(data) != RAW_SIZE:
+        metrics.REQUESTS.labels('predict', 'invalid_raw').inc()
+        return {
+            "success": False,
+            "error": f"Payload mentah harus {RAW_SIZE} bytes (224x224x3 uint8)."
+        }
+    start = time.perf_counter()
+    image = np.frombuffer(data, dtype=np.uint8).reshape(RAW_SHAPE)
+    probs, cache_hit = prediction_cache.get_or_compute(
+        data, model_version, lambda: run_image(image, deadline))
+    return prediction_response(data, probs, cache_hit, start, plot)
+
+def iter_uploads(files):
+    """(nama, bytes) per gambar dari pasangan (nama file, file object).
+
+    Arsip .zip dibaca satu anggota per satu.
+    """
+    for filename, stream in files:
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(stream) as archive:
+                for info in archive.infolist():
+                    name = info.filename
+                    if (info.is_dir() or name.startswith('__MACOSX/')
+                            or not name.lower().endswith(IMAGE_EXTENSIONS)):
+                        continue
+                    yield name, archive.read(info)
+        elif filename:
+            yield filename, stream.read()
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def classify_chunk(chunk, plot=None, deadline=None):
+    """Klasifikasi satu chunk POST /batch.
+
+    Gambar yang belum ada di cache masuk antrean inferensi yang sama
+    dengan POST / (dibatasi dan ber-deadline), jadi bisa melempar
+    QueueFull atau DeadlineExceeded.
+    """
+    start = time.perf_counter()
+    results = []
+    pending = []
+    for name, data in chunk:
+        key = prediction_cache.key(data, model_version)
+        result = {"filename": name, "data": data}
+        probs = prediction_cache.get(key)
+        metrics.CACHE.labels('miss' if probs is None else 'hit').inc()
+        if probs is not None:
+            result["cache"] = "hit"
+            result["probs"] = probs
+        else:
+            try:
+                pending.append((result, key, decode_image(data)))
+                result["cache"] = "miss"
+            except (UnidentifiedImageError, OSError):
+                result["success"] = False
+                result["error"] = "File bukan gambar yang valid."
+        results.append(result)
+
+    if pending:
+        check_deadline(deadline)
+        images = np.stack([image for _, _, image in pending])
+        if model_server is not None:
+            outputs = model_server.predict(images, block=False, deadline=deadline)
+        else:
+            outputs = batcher.predict(engine.prepare(images), deadline)
+        for (result, key, _), probs in zip(pending, outputs):
+            prediction_cache.put(key, probs)
+            result["probs"] = probs
+
+    # Latensi riwayat per gambar = waktu chunk dibagi rata
+    seconds = (time.perf_counter() - start) / len(chunk)
+    for result in results:
+        data = result.pop("data")
+        probs = result.pop("probs", None)
+        if probs is None:
+            continue
+        label_name, confidence, recommendation = describe_prediction(probs)
+        metrics.observe_prediction(label_name, confidence / 100)
+        record_history(data, probs, label_name, result["cache"] == "hit", seconds, plot)
+        result.update({
+            "success": True,
+            "label": label_name,
+            "confidence": round(confidence, 2),
+            "recommendation": recommendation,
+        })
+    return results
+
+def classify_batch_chunk(chunk, plot=None, timeout_header=None):
+    """(hasil, lanjut) untuk satu chunk POST /batch yang sedang di-stream.
+
+    Deadline dihitung per chunk. Jika chunk ditolak admission control,
+    setiap gambarnya mendapat hasil gagal dan stream dihentikan.
+    """
+    try:
+        return classify_chunk(chunk, plot, request_deadline(timeout_header)), True
+    except ADMISSION_ERRORS as e:
+        payload, _, _ = rejection(e, 'batch')
+        return [dict(payload, filename=name) for name, _ in chunk], False
+
+def batch_too_large():
+    """(payload JSON, status HTTP) untuk POST /batch yang melewati batas file/ukuran."""
+    metrics.REQUESTS.labels('batch', 'too_large').inc()
+    return {
+        "success": False,
+        "error": f"Maksimal {config.BATCH_MAX_FILES} file dan {config.BATCH_MAX_MB} MB "
+                 "per request; kirim banyak gambar sebagai satu file .zip."
+    }, 413
+
+def parse_time(value, default):
+    """Epoch detik atau tanggal/waktu ISO 8601 (tanpa zona = waktu lokal)."""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f'Waktu tidak valid: {value!r} (epoch detik atau ISO 8601)') from None
+
+def history_window(args):
+    until = parse_time(args.get('until'), time.time())
+    since = parse_time(args.get('since'), until - HISTORY_WINDOW_SECONDS)
+    return since, until
+
+def format_time(timestamp, timespec='seconds'):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec=timespec)
+
+def history_stats(args):
+    """(payload JSON, status HTTP) GET /history/stats: jumlah per bucket waktu x plot x label.
+
+    Parameter: ``since``/``until`` (bawaan 7 hari terakhir), ``bucket``
+    (day | hour) dan ``plot``.
+    """
+    if history is None:
+        return {"success": False, "error": "Riwayat prediksi tidak aktif."}, 404
+    try:
+        since, until = history_window(args)
+        bucket = args.get('bucket', 'day')
+        counts = history.stats(since, until, bucket, args.get('plot'))
+    except ValueError as e:
+        return {"success": False, "error": str(e)}, 400
+    totals = Counter()
+    for row in counts:
+        totals[row['label']] += row['count']
+    return {
+        "success": True,
+        "since": format_time(since),
+        "until": format_time(until),
+        "bucket": bucket,
+        "counts": counts,
+        "totals": dict(totals),
+    }, 200
+
+def history_rows(args):
+    """(payload JSON, status HTTP) GET /history: prediksi terbaru.
+
+    Parameter: ``since``/``until``, ``label``, ``plot`` dan ``limit`` (maks. 1000).
+    """
+    if history is None:
+        return {"success": False, "error": "Riwayat prediksi tidak aktif."}, 404
+    try:
+        since, until = history_window(args)
+        limit = args.get('limit', '100')
+        if not limit.isdigit() or not 1 <= int(limit) <= 1000:
+            raise ValueError('limit harus antara 1 dan 1000')
+        rows = history.query(since, until, args.get('label'), args.get('plot'), int(limit))
+    except ValueError as e:
+        return {"success": False, "error": str(e)}, 400
+    for row in rows:
+        row['created'] = format_time(row['created'], 'milliseconds')
+    return {"success": True, "predictions": rows}, 200
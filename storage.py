@@ -0,0 +1,207 @@
+"""Penyimpanan upload berbasis hash isi file.
+
+Upload disimpan sekali per isi: ``<root>/ab/cd/<sha256>.<ext>`` dengan
+preview ``<sha256>.<ukuran>.<format>`` di sebelahnya. Metadata (termasuk
+nama file asli) ditulis ke ``<metadata_root>/ab/cd/<sha256>.json``, di
+luar ``root`` yang disajikan publik lewat /uploads. Upload ulang file
+yang sama hanya memperbarui mtime-nya, yang dipakai sebagai waktu akses
+terakhir saat eviction. Eviction berjalan di thread background dan
+menghapus upload (beserta metadata dan preview-nya) yang lebih tua dari
+``max_age_seconds`` lalu upload yang paling lama tidak dipakai sampai
+total ukuran di bawah ``max_bytes``.
+
+File lain di ``root`` (fixture, upload lama ``<timestamp>_<nama>``) tidak
+pernah disentuh.
+"""
+import io
+import json
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+
+from PIL import Image, ImageOps
+from werkzeug.utils import secure_filename
+
+from cache import content_hash
+from preprocessing import IMAGE_EXTENSIONS
+
+
+_SHARD = re.compile(r'^[0-9a-f]{2}$')
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+_UPLOAD_PATH = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.[a-z]+$')
+PREVIEW_FORMATS = {'webp': ('WEBP', '.webp', {'quality': 80, 'method': 4}),
+                   'jpeg': ('JPEG', '.jpg', {'quality': 85, 'progressive': True})}
+
+
+def _extension(data, filename):
+    if data[:3] == b'\xff\xd8\xff':
+        return '.jpg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return '.png'
+    ext = os.path.splitext(secure_filename(filename))[1].lower()
+    return ext if ext in IMAGE_EXTENSIONS else '.bin'
+
+
+def render_preview(source, size, preview_format):
+    """Bytes preview dengan sisi terpanjang ``size`` px."""
+    pil_format, _, options = PREVIEW_FORMATS[preview_format]
+    with Image.open(source) as img:
+        # Decode JPEG langsung di resolusi kecil (DCT scaling)
+        img.draft('RGB', (size, size))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, pil_format, **options)
+    return out.getvalue()
+
+
+class UploadStore:
+    def __init__(self, root, max_bytes=0, max_age_seconds=0, on_evict=None,
+                 preview_sizes=(), preview_format='webp', metadata_root=None):
+        if preview_format not in PREVIEW_FORMATS:
+            raise ValueError(f'Format preview tidak dikenal: {preview_format!r} '
+                             f'(pilih salah satu dari {sorted(PREVIEW_FORMATS)})')
+        self.root = root
+        self.metadata_root = metadata_root or os.path.normpath(root) + '_metadata'
+        self.max_bytes = max_bytes
+        self.max_age = max_age_seconds
+        self.on_evict = on_evict
+        self.preview_sizes = tuple(preview_sizes)
+        self.preview_format = preview_format
+        self._evictor = None
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, data, filename):
+        """Path relatif terhadap ``root`` (juga path URL di bawah /uploads/)."""
+        digest = content_hash(data)
+        return '/'.join((digest[:2], digest[2:4], digest + _extension(data, filename)))
+
+    @staticmethod
+    def is_upload_path(relative_path):
+        return _UPLOAD_PATH.match(relative_path) is not None
+
+    def metadata_path_for(self, digest):
+        return os.path.join(self.metadata_root, digest[:2], digest[2:4], digest + '.json')
+
+    def preview_path_for(self, relative_path, size):
+        extension = PREVIEW_FORMATS[self.preview_format][1]
+        return f'{relative_path.rsplit(".", 1)[0]}.{size}{extension}'
+
+    def save(self, data, filename, relative_path=None):
+        relative_path = relative_path or self.path_for(data, filename)
+        path = os.path.join(self.root, relative_path)
+        if os.path.exists(path):
+            # Duplikat: cukup tandai sebagai baru dipakai
+            os.utime(path)
+            return relative_path
+
+        digest = os.path.basename(path).split('.')[0]
+        metadata_path = self.metadata_path_for(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+        self._write(metadata_path, json.dumps({
+            'sha256': digest,
+            'size': len(data),
+            'content_type': mimetypes.guess_type(path)[0],
+            'original_filename': filename,
+            'created': time.time(),
+        }).encode())
+        for size in self.preview_sizes:
+            self.preview(relative_path, size, data)
+        # Gambar ditulis terakhir: keberadaannya menandakan entri lengkap
+        self._write(path, data)
+        return relative_path
+
+    def preview(self, relative_path, size, data=None):
+        """Path absolut preview, dibuat sekali dari ``data`` atau file asli.
+
+        ``None`` jika upload tidak ada di store.
+        """
+        if size not in self.preview_sizes or not self.is_upload_path(relative_path):
+            return None
+        path = os.path.join(self.root, self.preview_path_for(relative_path, size))
+        if os.path.exists(path):
+            return path
+        if data is None:
+            try:
+                with open(os.path.join(self.root, relative_path), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+        self._write(path, render_preview(io.BytesIO(data), size, self.preview_format))
+        return path
+
+    @staticmethod
+    def _write(path, data):
+        # Tulis ke file sementara lalu rename agar pembaca tidak melihat file setengah jadi
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def entries(self):
+        """{digest: (mtime terakhir, total bytes, [path file])} untuk semua upload di store."""
+        entries = {}
+        for shard in os.listdir(self.root):
+            if not _SHARD.match(shard) or not os.path.isdir(os.path.join(self.root, shard)):
+                continue
+            for subshard in os.listdir(os.path.join(self.root, shard)):
+                directory = os.path.join(self.root, shard, subshard)
+                if not _SHARD.match(subshard) or not os.path.isdir(directory):
+                    continue
+                for entry in os.scandir(directory):
+                    digest = entry.name.split('.')[0]
+                    if not _DIGEST.match(digest):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    mtime, size, paths = entries.get(digest, (0.0, 0, []))
+                    entries[digest] = (max(mtime, stat.st_mtime), size + stat.st_size,
+                                       paths + [entry.path])
+        return entries
+
+    def evict(self, now=None):
+        """Hapus upload yang melewati batas umur/ukuran; kembalikan (jumlah dihapus, total bytes)."""
+        now = now or time.time()
+        # Paling lama tidak dipakai dulu
+        entries = sorted(self.entries().items(), key=lambda item: item[1])
+        total = sum(size for _, (_, size, _) in entries)
+        evicted = 0
+        for digest, (mtime, size, paths) in entries:
+            expired = self.max_age and now - mtime > self.max_age
+            over_budget = self.max_bytes and total > self.max_bytes
+            if not (expired or over_budget):
+                continue
+            for path in paths + [self.metadata_path_for(digest)]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        if self.on_evict is not None:
+            self.on_evict(evicted, total)
+        return evicted, total
+
+    def start_evictor(self, interval_seconds=300):
+        if self._evictor is not None or not (self.max_bytes or self.max_age):
+            return
+
+        def run():
+            while True:
+                try:
+                    self.evict()
+                except OSError:
+                    pass
+                time.sleep(interval_seconds)
+        self._evictor = threading.Thread(target=run, name='upload-evictor', daemon=True)
+        self._evictor.start()
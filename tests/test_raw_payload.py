@@ -0,0 +1,77 @@
+"""POST / dengan payload mentah application/octet-stream (224x224x3 uint8)."""
+import io
+import os
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join('images', 'Healthy_1.jpg')
+# Tanpa profil, cache, riwayat dan penyimpanan upload: setiap request
+# benar-benar melewati model
+ENV = {
+    'MANGALYZE_PROFILE': '',
+    'MANGALYZE_SAVE_UPLOADS': '0',
+    'MANGALYZE_HISTORY_PATH': '',
+    'MANGALYZE_CACHE_MAX_ENTRIES': '0',
+    'MANGALYZE_CACHE_PATH': '',
+    'MANGALYZE_MODEL_SERVER': '0',
+    'MANGALYZE_RATE_LIMIT_PER_SECOND': '0',
+}
+
+
+@pytest.fixture(scope='module')
+def client():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(ROOT)
+        for name, value in ENV.items():
+            mp.setenv(name, value)
+        import config
+        from inference import DEFAULT_MODEL_PATHS
+        model_path = config.MODEL_PATH or DEFAULT_MODEL_PATHS[config.BACKEND]
+        if not os.path.exists(model_path):
+            pytest.skip(f'model {model_path} tidak ada')
+        import main
+        import service
+        assert service.ready.wait(600), 'warm-up model tidak selesai'
+        yield main.app.test_client()
+
+
+@pytest.fixture(scope='module')
+def raw_image():
+    from preprocessing import decode_image
+    # Resize nearest yang sama dengan jalur JPEG
+    return decode_image(os.path.join(ROOT, FIXTURE)).tobytes()
+
+
+def post_raw(client, data):
+    return client.post('/', data=data, content_type='application/octet-stream').get_json()
+
+
+def test_raw_payload_matches_jpeg_upload(client, raw_image):
+    import service
+    assert len(raw_image) == service.RAW_SIZE
+
+    raw = post_raw(client, raw_image)
+    with open(FIXTURE, 'rb') as f:
+        upload = client.post('/', data={'imagefile': (io.BytesIO(f.read()), 'daun.jpg')},
+                             content_type='multipart/form-data').get_json()
+
+    assert raw['success'] and upload['success']
+    assert raw['prediction'] == upload['prediction']
+    assert raw['recommendation'] == upload['recommendation']
+    assert raw['image_url'] is None
+
+
+@pytest.mark.parametrize('size', [0, 1, -1], ids=['empty', 'one_byte', 'one_byte_short'])
+def test_raw_payload_too_short(client, raw_image, size):
+    result = post_raw(client, raw_image[:size])
+    assert not result['success']
+    assert str(len(raw_image)) in result['error']
+
+
+@pytest.mark.parametrize('extra', [b'\0', b'\0' * 224 * 3], ids=['one_byte', 'one_row'])
+def test_raw_payload_too_long(client, raw_image, extra):
+    result = post_raw(client, raw_image + extra)
+    assert not result['success']
+    assert str(len(raw_image)) in result['error']